@@ -0,0 +1,184 @@
+"""Bulk re-analysis of stored memos through the Message Batches API.
+
+Re-runs the analyst prompt over selected memos (after prompt / category
+changes) at batch pricing and writes titles, bullets, categories and tags
+back in bulk. Every chunk is submitted first, then all batches are polled
+together. Progress is checkpointed to a JSON state file after every step,
+so an interrupted run resumes where it stopped:
+
+    python -m app.backfill --category 정보 --since 2025-01-01
+    python -m app.backfill --source-type web --state .cache/backfill_web.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from . import claude_client, extractor, supabase_client
+from .config import CACHE_DIR
+from .schemas import ANALYST_SCHEMA
+from .workers import ANALYST_SYSTEM, _ensure_list, analyst_input
+
+log = logging.getLogger(__name__)
+
+EXTRACT_CONCURRENCY = 8
+
+
+def _load_state(path: str, filters: dict) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("filters") != filters:
+            raise SystemExit(f"{path} belongs to a run with different filters: {state.get('filters')}")
+        return state
+    return {"filters": filters, "after_id": None, "batches": {}, "updated": 0, "failed": 0}
+
+
+def _save_state(path: str, state: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+async def _memo_input(memo: dict, sem: asyncio.Semaphore) -> str:
+    """Rebuild the analyst user message: stored raw_content, or re-extract URL-only memos."""
+    raw = (memo.get("raw_content") or "").strip()
+    if raw:
+        return raw
+    url = memo.get("source_url") or ""
+    if not url.startswith("http"):
+        return ""
+    async with sem:
+        _, extracted = await extractor.extract_text(url)
+    return analyst_input("", extracted)
+
+
+async def _submit_chunk(memos: list[dict]) -> tuple[str | None, dict]:
+    sem = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+    inputs = await asyncio.gather(*(_memo_input(m, sem) for m in memos))
+    requests = []
+    urls = {}
+    for memo, text in zip(memos, inputs):
+        if not text:
+            continue
+        requests.append(claude_client.batch_request(memo["id"], ANALYST_SYSTEM, text, ANALYST_SCHEMA))
+        urls[memo["id"]] = memo["source_url"]
+    if not requests:
+        return None, urls
+    return await claude_client.submit_batch(requests), urls
+
+
+async def _apply_batch(batch_id: str, info: dict) -> tuple[int, int]:
+    """Bulk-write the results of an ended batch. Returns (updated, failed)."""
+    results = await claude_client.batch_results(batch_id)
+    rows = []
+    # Only ids are needed: the write is an UPDATE, so state files from any
+    # earlier version (with or without a "chats" map) resume the same way
+    for memo_id in info["urls"]:
+        r = results.get(memo_id)
+        if not r:
+            continue
+        rows.append({
+            "id": memo_id,
+            "title": r["title"],
+            "summary_bullets": _ensure_list(r["bullets"]),
+            "category": r["category"],
+            "tags": _ensure_list(r["tags"]),
+        })
+    written = await asyncio.to_thread(supabase_client.update_memo_analyses, rows)
+    return written, len(info["urls"]) - len(rows)
+
+
+async def _submit_all(filters: dict, state: dict, state_path: str, chunk: int, limit: int | None) -> int:
+    """Select and submit every remaining chunk, checkpointing each batch id. Returns memos selected."""
+    selected = sum(len(b["urls"]) for b in state["batches"].values())
+    while limit is None or selected < limit:
+        size = chunk if limit is None else min(chunk, limit - selected)
+        memos = await asyncio.to_thread(
+            supabase_client.select_memos_for_backfill, after_id=state["after_id"], limit=size, **filters,
+        )
+        if not memos:
+            break
+        batch_id, urls = await _submit_chunk(memos)
+        state["after_id"] = memos[-1]["id"]
+        selected += len(memos)
+        if batch_id:
+            state["batches"][batch_id] = {"status": "submitted", "urls": urls}
+        state["failed"] += len(memos) - len(urls)
+        _save_state(state_path, state)
+        log.info("backfill submitted: selected=%d batches=%d", selected, len(state["batches"]))
+    return selected
+
+
+async def _poll_all(state: dict, state_path: str, poll: int) -> None:
+    """Poll every open batch together and apply each one as soon as it ends."""
+    while True:
+        open_ids = [b for b, info in state["batches"].items() if info["status"] == "submitted"]
+        if not open_ids:
+            return
+        statuses = await asyncio.gather(*(claude_client.batch_status(b) for b in open_ids))
+        for batch_id, (status, counts) in zip(open_ids, statuses):
+            if status != "ended":
+                log.info("batch %s: %s %s", batch_id, status, counts)
+                continue
+            info = state["batches"][batch_id]
+            updated, failed = await _apply_batch(batch_id, info)
+            info["status"] = "applied"
+            state["updated"] += updated
+            state["failed"] += failed
+            _save_state(state_path, state)
+            log.info("backfill progress: updated=%d failed=%d", state["updated"], state["failed"])
+        if any(state["batches"][b]["status"] == "submitted" for b in open_ids):
+            await asyncio.sleep(poll)
+
+
+async def run(filters: dict, state_path: str, chunk: int, poll: int, limit: int | None) -> dict:
+    """Submit all chunks up front, then wait for the batches in parallel.
+
+    Batches process concurrently on Anthropic's side, so the run takes about one
+    batch turnaround instead of one per chunk. A resumed run submits whatever
+    was not yet selected and picks up the open batches from the state file.
+    """
+    state = _load_state(state_path, filters)
+    selected = await _submit_all(filters, state, state_path, chunk, limit)
+    await _poll_all(state, state_path, poll)
+    return {"selected": selected, "updated": state["updated"], "failed": state["failed"]}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Re-analyze stored memos via the Message Batches API.")
+    ap.add_argument("--category")
+    ap.add_argument("--since", help="created_at >= (ISO date)")
+    ap.add_argument("--until", help="created_at < (ISO date)")
+    ap.add_argument("--source-type", help="web | x | instagram | image")
+    ap.add_argument("--limit", type=int, help="stop after this many memos")
+    ap.add_argument("--chunk", type=int, default=1000, help="memos per batch")
+    ap.add_argument("--poll", type=int, default=30, help="seconds between status polls")
+    ap.add_argument("--state", default=os.path.join(CACHE_DIR, "backfill_state.json"))
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    filters = {
+        "category": args.category,
+        "since": args.since,
+        "until": args.until,
+        "source_type": args.source_type,
+    }
+    summary = asyncio.run(_main(filters, args))
+    log.info("backfill done: %s", summary)
+
+
+async def _main(filters: dict, args: argparse.Namespace) -> dict:
+    try:
+        return await run(filters, args.state, args.chunk, args.poll, args.limit)
+    finally:
+        await extractor.aclose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Rate-limited fan-out of messages to many chats (scheduled pushes).
+
+Telegram allows roughly 30 messages/s per bot and 1 message/s per chat
+(20/min in groups). A shared token bucket keeps the whole process under
+BROADCAST_RATE, a per-chat gate spaces messages to the same chat, and a
+fixed pool of BROADCAST_CONCURRENCY senders keeps requests in flight so
+thousands of chats take seconds instead of minutes.
+
+RetryAfter (flood control) pauses the bucket for every sender and retries;
+timeouts and network errors are retried with backoff; chats that blocked the
+bot or no longer exist are marked inactive and skipped by later pushes.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from . import supabase_client
+from .config import BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES, BROADCAST_RATE
+
+log = logging.getLogger(__name__)
+
+_CHAT_INTERVAL = 1.0   # private chats: 1 msg/s
+_GROUP_INTERVAL = 3.0  # groups (negative chat_id): 20 msg/min
+_BACKOFF_BASE = 1.0
+_BACKOFF_CAP = 30.0
+_GONE_MARKERS = ("chat not found", "user is deactivated", "bot was kicked", "chat_write_forbidden")
+
+
+class _TokenBucket:
+    """Process-wide send rate: `rate` tokens/s, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:  # FIFO: waiters are served in arrival order
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Flood control hit: nobody sends until the server's retry_after has passed."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+_bucket: _TokenBucket | None = None  # created lazily: asyncio.Lock binds to the running loop
+_chat_next: dict[int, float] = {}    # chat_id -> earliest monotonic time for its next message
+_last_runs: dict[str, dict] = {}
+
+
+def _get_bucket() -> _TokenBucket:
+    global _bucket
+    if _bucket is None:
+        _bucket = _TokenBucket(BROADCAST_RATE, capacity=BROADCAST_RATE)
+    return _bucket
+
+
+async def _chat_gate(chat_id: int) -> None:
+    interval = _GROUP_INTERVAL if chat_id < 0 else _CHAT_INTERVAL
+    now = time.monotonic()
+    ready = _chat_next.get(chat_id, 0.0)
+    _chat_next[chat_id] = max(now, ready) + interval
+    if ready > now:
+        await asyncio.sleep(ready - now)
+
+
+def _seconds(retry_after) -> float:
+    # int in python-telegram-bot 21, timedelta from 22 on
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+async def _deliver(bot: Bot, chat_id: int, text: str, kwargs: dict, stats: dict) -> str:
+    """Send one message with retries. Returns 'sent' | 'blocked' | 'failed'."""
+    bucket = _get_bucket()
+    for attempt in range(BROADCAST_MAX_RETRIES + 1):
+        await _chat_gate(chat_id)
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return "sent"
+        except RetryAfter as e:
+            wait = _seconds(e.retry_after)
+            stats["rate_limited"] += 1
+            log.warning("Broadcast flood control: pausing %.1fs", wait)
+            bucket.pause(wait)
+        except Forbidden:
+            return "blocked"
+        except BadRequest as e:  # subclass of NetworkError: check first
+            if any(m in str(e).lower() for m in _GONE_MARKERS):
+                return "blocked"
+            log.warning("Broadcast to chat_id=%s rejected: %s", chat_id, e)
+            return "failed"
+        except NetworkError as e:  # includes TimedOut
+            if attempt == BROADCAST_MAX_RETRIES:
+                log.warning("Broadcast to chat_id=%s gave up: %s", chat_id, e)
+                return "failed"
+            await asyncio.sleep(min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            log.exception("Broadcast to chat_id=%s failed", chat_id)
+            return "failed"
+        stats["retries"] += 1
+    return "failed"
+
+
+async def broadcast(bot: Bot, chat_ids: list[int], text: str, *, label: str = "broadcast", **kwargs) -> dict:
+    """Send the same `text` to every chat; extra kwargs go to send_message. Returns run stats."""
+    return await send_each(bot, {chat_id: text for chat_id in chat_ids}, label=label, **kwargs)
+
+
+async def send_each(bot: Bot, messages: dict[int, str], *, label: str = "broadcast", **kwargs) -> dict:
+    """Send messages[chat_id] to each chat (per-chat content, e.g. recommendations). Returns run stats."""
+    stats = {"chats": len(messages), "sent": 0, "blocked": 0, "failed": 0, "retries": 0, "rate_limited": 0}
+    queue = list(reversed(messages))
+    blocked: list[int] = []
+    started = time.monotonic()
+
+    async def sender() -> None:
+        while queue:
+            chat_id = queue.pop()
+            outcome = await _deliver(bot, chat_id, messages[chat_id], kwargs, stats)
+            stats[outcome] += 1
+            if outcome == "blocked":
+                blocked.append(chat_id)
+
+    await asyncio.gather(*(sender() for _ in range(min(BROADCAST_CONCURRENCY, len(messages)))))
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["per_s"] = round(stats["sent"] / elapsed, 1) if elapsed > 0 else 0
+    if blocked:
+        try:
+            await asyncio.to_thread(supabase_client.deactivate_users, blocked)
+        except Exception:
+            log.exception("Failed to deactivate %d blocked chats", len(blocked))
+    now = time.monotonic()
+    for chat_id in [c for c, t in _chat_next.items() if t < now]:
+        del _chat_next[chat_id]
+
+    _last_runs[label] = stats
+    log.info(
+        "Broadcast %s: %d/%d sent, %d blocked, %d failed, %d retries (%d flood waits) in %.1fs (%.1f msg/s)",
+        label, stats["sent"], stats["chats"], stats["blocked"], stats["failed"],
+        stats["retries"], stats["rate_limited"], elapsed, stats["per_s"],
+    )
+    return stats
+
+
+def last_run_stats() -> dict:
+    """Most recent run per label, for /stats."""
+    return {
+        label: f"{s['sent']}/{s['chats']} 전송, 차단 {s['blocked']}, 실패 {s['failed']}, {s['per_s']}/s"
+        for label, s in _last_runs.items()
+    }
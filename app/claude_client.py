@@ -1,90 +1,379 @@
 """Thin Claude API wrapper with strict JSON schema via tool use."""
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
 import logging
-from anthropic import Anthropic
-from .config import ANTHROPIC_API_KEY, CLAUDE_MODEL
+import os
+import random
+import time
+from anthropic import APIConnectionError, APIStatusError, AsyncAnthropic
+from .config import (
+    ANTHROPIC_API_KEY,
+    CACHE_DIR,
+    CLAUDE_CACHE_MAX_MB,
+    CLAUDE_CACHE_TTL,
+    CLAUDE_MAX_CONCURRENCY,
+    CLAUDE_MAX_RETRIES,
+    CLAUDE_MODEL,
+)
+from .disk_cache import DiskCache
 
 log = logging.getLogger(__name__)
-_client = Anthropic(api_key=ANTHROPIC_API_KEY)
+# SDK retries off: _create owns retry/backoff so it can respect the shared limiter
+_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
 
+# Lower value = served first when the limiter is saturated
+PRIORITY_INTERACTIVE = 0  # user-facing analysis / recommendations
+PRIORITY_BACKGROUND = 1   # banter, greetings, scheduled pushes
 
-def ask_json(system: str, user: str, schema: dict, max_tokens: int = 1024) -> dict:
-    """Call Claude and enforce JSON output via tool use (guaranteed valid schema)."""
-    tool = {
+_RETRY_STATUS = {429, 500, 502, 503, 504, 529}
+_BACKOFF_BASE = 1.0
+_BACKOFF_CAP = 30.0
+
+
+class _Limiter:
+    """Process-wide cap on in-flight Claude requests with priority ordering."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.stats = {"acquired": 0, "queued": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+
+    async def acquire(self, priority: int) -> float:
+        """Wait for a slot; return seconds spent queued."""
+        self.stats["acquired"] += 1
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return 0.0
+        self.stats["queued"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        started = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # slot was handed over just as we were cancelled
+            raise
+        waited = time.monotonic() - started
+        self.stats["wait_total_s"] += waited
+        self.stats["wait_max_s"] = max(self.stats["wait_max_s"], waited)
+        return waited
+
+    def release(self) -> None:
+        # Hand the slot straight to the best waiter; _active stays the same
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    def snapshot(self) -> dict:
+        queued = self.stats["queued"]
+        return {
+            "limit": self.limit,
+            "in_flight": self._active,
+            "waiting": sum(1 for *_, f in self._waiters if not f.done()),
+            "acquired": self.stats["acquired"],
+            "queued": queued,
+            "wait_avg_s": round(self.stats["wait_total_s"] / queued, 2) if queued else 0,
+            "wait_max_s": round(self.stats["wait_max_s"], 2),
+        }
+
+
+_limiter = _Limiter(CLAUDE_MAX_CONCURRENCY)
+
+
+def set_concurrency(limit: int) -> None:
+    """Override CLAUDE_MAX_CONCURRENCY for this process (bulk CLIs). Call before any request."""
+    _limiter.limit = max(1, limit)
+
+
+_retry_stats = {"retries": 0, "rate_limited": 0, "overloaded": 0, "gave_up": 0}
+
+# Content-addressed result cache for ask_json(cache=True); LRU-evicted by size
+_cache = DiskCache(os.path.join(CACHE_DIR, "claude.sqlite3"), max_bytes=CLAUDE_CACHE_MAX_MB * 1024 * 1024)
+_cache_stats = {"hit": 0, "miss": 0}
+
+
+def _tool(schema: dict) -> dict:
+    return {
         "name": "structured_output",
         "description": "Return the structured result.",
         "input_schema": schema,
     }
-    resp = _client.messages.create(
-        model=CLAUDE_MODEL,
+
+
+def _cached_system(system: str) -> list[dict]:
+    """System prompt as a cache breakpoint.
+
+    Prompt caching covers the prefix tools -> system, so marking the system
+    block caches the tool schema too. Keep per-call values out of `system`
+    (put them in the user message) or every call writes a new cache entry.
+    Prefixes below the model's minimum cacheable length are simply not cached.
+    """
+    return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
+
+def _log_usage(label: str, resp) -> None:
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    log.info(
+        "%s usage: input=%s cache_write=%s cache_read=%s output=%s",
+        label,
+        usage.input_tokens,
+        getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        getattr(usage, "cache_read_input_tokens", 0) or 0,
+        usage.output_tokens,
+    )
+
+
+def _retry_delay(attempt: int, exc: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after."""
+    delay = random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+    response = getattr(exc, "response", None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if headers.get("retry-after-ms"):
+                delay = max(delay, float(headers["retry-after-ms"]) / 1000)
+            elif headers.get("retry-after"):
+                delay = max(delay, float(headers["retry-after"]) + random.uniform(0, 1))
+        except ValueError:
+            pass  # HTTP-date form: keep the jittered backoff
+    return delay
+
+
+async def _retrying(label: str, call, *, retry_connection: bool = True):
+    """Await call() and retry 429/5xx/529 (and connection errors) with jittered backoff."""
+    for attempt in range(CLAUDE_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except (APIStatusError, APIConnectionError) as e:
+            status = getattr(e, "status_code", None)
+            if isinstance(e, APIStatusError) and status not in _RETRY_STATUS:
+                raise
+            if not isinstance(e, APIStatusError) and not retry_connection:
+                raise
+            if status == 429:
+                _retry_stats["rate_limited"] += 1
+            elif status == 529:
+                _retry_stats["overloaded"] += 1
+            if attempt == CLAUDE_MAX_RETRIES:
+                _retry_stats["gave_up"] += 1
+                raise
+            reason = status or type(e).__name__
+            delay = _retry_delay(attempt, e)
+
+        _retry_stats["retries"] += 1
+        log.warning("%s failed (%s), retry %d/%d in %.1fs", label, reason, attempt + 1, CLAUDE_MAX_RETRIES, delay)
+        await asyncio.sleep(delay)
+
+
+async def _create(label: str, system: str, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+    """Single entry point for messages.create.
+
+    Goes through the shared limiter (CLAUDE_MAX_CONCURRENCY in flight, lower
+    priority value first), retries 429/5xx/529 and connection errors with
+    jittered backoff, sends the system prompt as a cached prefix and logs usage.
+    """
+    async def call():
+        waited = await _limiter.acquire(priority)
+        if waited > 1:
+            log.info("%s waited %.1fs for a Claude slot", label, waited)
+        try:
+            return await _client.messages.create(model=CLAUDE_MODEL, system=_cached_system(system), **kwargs)
+        finally:
+            _limiter.release()
+
+    resp = await _retrying(label, call)
+    _log_usage(label, resp)
+    return resp
+
+
+def limiter_stats() -> dict:
+    """Limiter queue/wait metrics plus retry counters (for /stats)."""
+    return {**_limiter.snapshot(), **_retry_stats}
+
+
+async def _create_structured(
+    system: str, messages: list[dict], schema: dict, max_tokens: int, label: str, priority: int,
+):
+    """Send a forced tool-use request, retrying once with doubled max_tokens on truncation."""
+    tool = _tool(schema)
+    resp = await _create(
+        label,
+        system,
+        priority,
         max_tokens=max_tokens,
-        system=system,
-        messages=[{"role": "user", "content": user}],
+        messages=messages,
         tools=[tool],
         tool_choice={"type": "tool", "name": "structured_output"},
     )
 
     if resp.stop_reason == "max_tokens":
-        log.warning("ask_json truncated (max_tokens=%d), retrying with %d", max_tokens, max_tokens * 2)
-        resp = _client.messages.create(
-            model=CLAUDE_MODEL,
+        log.warning("%s truncated (max_tokens=%d), retrying with %d", label, max_tokens, max_tokens * 2)
+        resp = await _create(
+            label,
+            system,
+            priority,
             max_tokens=max_tokens * 2,
-            system=system,
-            messages=[{"role": "user", "content": user}],
+            messages=messages,
             tools=[tool],
             tool_choice={"type": "tool", "name": "structured_output"},
         )
 
     if resp.stop_reason == "max_tokens":
-        raise ValueError(f"Response still truncated after retry (max_tokens={max_tokens * 2})")
+        raise ValueError(f"{label} response still truncated after retry (max_tokens={max_tokens * 2})")
+    return resp
+
 
+def _tool_input(resp, label: str) -> dict:
     for block in resp.content:
         if block.type == "tool_use":
             return block.input
-    raise ValueError("No tool_use block in response")
+    raise ValueError(f"No tool_use block in {label} response")
+
+
+def _cache_key(system: str, user: str, schema: dict) -> str:
+    blob = json.dumps([CLAUDE_MODEL, system, user, schema], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def cache_stats() -> dict:
+    lookups = _cache_stats["hit"] + _cache_stats["miss"]
+    return {
+        **_cache_stats,
+        "hit_rate": f"{_cache_stats['hit'] / lookups:.0%}" if lookups else "-",
+        **_cache.info(),
+    }
 
 
-def ask_json_with_image(
+async def ask_json(
+    system: str,
+    user: str,
+    schema: dict,
+    max_tokens: int = 1024,
+    cache: bool = False,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> dict:
+    """Call Claude and enforce JSON output via tool use (guaranteed valid schema).
+
+    cache=True serves identical (model, system, user, schema) requests from the
+    on-disk result cache for CLAUDE_CACHE_TTL seconds; hits carry "_cache": "hit".
+    """
+    key = _cache_key(system, user, schema) if cache and CLAUDE_CACHE_TTL > 0 else None
+    if key:
+        entry = await asyncio.to_thread(_cache.get, key)
+        if entry and time.time() - entry[1] < CLAUDE_CACHE_TTL:
+            _cache_stats["hit"] += 1
+            result, _ = entry
+            result["_cache"] = "hit"
+            return result
+        if entry:
+            await asyncio.to_thread(_cache.delete, key)
+        _cache_stats["miss"] += 1
+
+    messages = [{"role": "user", "content": user}]
+    resp = await _create_structured(system, messages, schema, max_tokens, "ask_json", priority)
+    result = _tool_input(resp, "ask_json")
+    if key:
+        await asyncio.to_thread(_cache.set, key, result)
+    return result
+
+
+async def ask_json_with_image(
     system: str,
     image_b64: str,
     media_type: str,
     user_text: str,
     schema: dict,
     max_tokens: int = 1024,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> dict:
     """Call Claude vision API with a base64 image and enforce JSON via tool use."""
-    tool = {
-        "name": "structured_output",
-        "description": "Return the structured result.",
-        "input_schema": schema,
-    }
     content = [
         {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": image_b64}},
         {"type": "text", "text": user_text if user_text else "이미지를 분석해주세요."},
     ]
     messages = [{"role": "user", "content": content}]
-    resp = _client.messages.create(
-        model=CLAUDE_MODEL,
+    resp = await _create_structured(system, messages, schema, max_tokens, "ask_json_with_image", priority)
+    return _tool_input(resp, "ask_json_with_image")
+
+
+async def ask_text(
+    system: str,
+    user: str,
+    max_tokens: int = 100,
+    label: str = "ask_text",
+    priority: int = PRIORITY_BACKGROUND,
+) -> str:
+    """Plain-text completion; returns the first line only (banter / greetings)."""
+    resp = await _create(
+        label,
+        system,
+        priority,
         max_tokens=max_tokens,
-        system=system,
-        messages=messages,
-        tools=[tool],
-        tool_choice={"type": "tool", "name": "structured_output"},
+        messages=[{"role": "user", "content": user}],
     )
-    if resp.stop_reason == "max_tokens":
-        log.warning("ask_json_with_image truncated (max_tokens=%d), retrying with %d", max_tokens, max_tokens * 2)
-        resp = _client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=max_tokens * 2,
-            system=system,
-            messages=messages,
-            tools=[tool],
-            tool_choice={"type": "tool", "name": "structured_output"},
-        )
-    if resp.stop_reason == "max_tokens":
-        raise ValueError(f"Vision response still truncated after retry (max_tokens={max_tokens * 2})")
-    for block in resp.content:
-        if block.type == "tool_use":
-            return block.input
-    raise ValueError("No tool_use block in vision response")
+    return resp.content[0].text.strip().split("\n")[0].strip()
+
+
+# ── Message Batches (bulk re-analysis) ───────────────────────
+def batch_request(custom_id: str, system: str, user: str, schema: dict, max_tokens: int = 1024) -> dict:
+    """One Message Batches entry equivalent to ask_json(system, user, schema)."""
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": CLAUDE_MODEL,
+            "max_tokens": max_tokens,
+            "system": _cached_system(system),
+            "messages": [{"role": "user", "content": user}],
+            "tools": [_tool(schema)],
+            "tool_choice": {"type": "tool", "name": "structured_output"},
+        },
+    }
+
+
+async def submit_batch(requests: list[dict]) -> str:
+    # A dropped connection may hide a created batch: only retry explicit error statuses
+    batch = await _retrying(
+        "submit_batch", lambda: _client.messages.batches.create(requests=requests), retry_connection=False,
+    )
+    log.info("Submitted batch %s (%d requests)", batch.id, len(requests))
+    return batch.id
+
+
+async def batch_status(batch_id: str) -> tuple[str, dict]:
+    """Return (processing_status, request_counts)."""
+    batch = await _retrying("batch_status", lambda: _client.messages.batches.retrieve(batch_id))
+    return batch.processing_status, batch.request_counts.model_dump()
+
+
+async def batch_results(batch_id: str) -> dict[str, dict | None]:
+    """custom_id -> tool input, or None for errored/expired/truncated entries.
+
+    The whole download is retried if the stream fails part way.
+    """
+    return await _retrying("batch_results", lambda: _read_batch_results(batch_id))
+
+
+async def _read_batch_results(batch_id: str) -> dict[str, dict | None]:
+    results: dict[str, dict | None] = {}
+    async for entry in await _client.messages.batches.results(batch_id):
+        result = None
+        if entry.result.type == "succeeded" and entry.result.message.stop_reason != "max_tokens":
+            try:
+                result = _tool_input(entry.result.message, "batch")
+            except ValueError:
+                pass
+        results[entry.custom_id] = result
+    return results
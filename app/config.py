@@ -12,4 +12,36 @@ SUPABASE_ANON_KEY = os.environ["SUPABASE_ANON_KEY"]
 # Optional
 VERBOSE_DEFAULT = os.environ.get("VERBOSE_DEFAULT", "0") == "1"
 CLAUDE_MODEL = os.environ.get("CLAUDE_MODEL", "claude-sonnet-4-5-20250929")
+CLAUDE_MAX_CONCURRENCY = int(os.environ.get("CLAUDE_MAX_CONCURRENCY", "4"))
+CLAUDE_MAX_RETRIES = int(os.environ.get("CLAUDE_MAX_RETRIES", "5"))
 MAX_EXTRACT_CHARS = int(os.environ.get("MAX_EXTRACT_CHARS", "4000"))
+MAX_FETCH_BYTES = int(os.environ.get("MAX_FETCH_BYTES", "2000000"))
+
+# Local caches
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+EXTRACT_CACHE_TTL = int(os.environ.get("EXTRACT_CACHE_TTL", "86400"))  # seconds; 0 disables
+EXTRACT_CACHE_MAX_MB = int(os.environ.get("EXTRACT_CACHE_MAX_MB", "64"))
+CLAUDE_CACHE_TTL = int(os.environ.get("CLAUDE_CACHE_TTL", "604800"))  # seconds; 0 disables
+CLAUDE_CACHE_MAX_MB = int(os.environ.get("CLAUDE_CACHE_MAX_MB", "32"))
+
+# Write-behind batching for memo saves
+MEMO_FLUSH_MS = int(os.environ.get("MEMO_FLUSH_MS", "50"))  # 0 = write-through
+MEMO_FLUSH_SIZE = int(os.environ.get("MEMO_FLUSH_SIZE", "50"))
+
+# In-process read cache for list/category/search/view (invalidated on every memo write)
+MEMO_CACHE_TTL = int(os.environ.get("MEMO_CACHE_TTL", "300"))  # seconds; 0 disables
+MEMO_CACHE_SIZE = int(os.environ.get("MEMO_CACHE_SIZE", "512"))  # entries
+
+# Optional local SQLite FTS5 replica for /search (Hangul bigram index)
+SEARCH_REPLICA = os.environ.get("SEARCH_REPLICA", "0") == "1"
+SEARCH_REPLICA_SYNC_SECONDS = int(os.environ.get("SEARCH_REPLICA_SYNC_SECONDS", "60"))
+
+# Embeddings for semantic /search ~query and /similar: hash (local) | openai | off
+EMBEDDINGS_PROVIDER = os.environ.get("EMBEDDINGS_PROVIDER", "hash")
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_EMBED_MODEL = os.environ.get("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+
+# Scheduled push fan-out (Telegram: ~30 msg/s per bot, 1 msg/s per chat)
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "25"))  # messages/s across all chats
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "16"))
+BROADCAST_MAX_RETRIES = int(os.environ.get("BROADCAST_MAX_RETRIES", "3"))
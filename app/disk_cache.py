@@ -0,0 +1,110 @@
+"""Small persistent key/value cache on SQLite (stdlib only).
+
+Values are JSON dicts. Entries remember when they were stored (for the
+caller's freshness/TTL decisions) and when they were last read (for LRU
+eviction once the total size exceeds max_bytes).
+
+Every call is blocking SQLite I/O: async callers go through asyncio.to_thread.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._total = 0
+        self._count = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+            self._count, self._total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> tuple[dict, float] | None:
+        """Return (value, stored_at) or None. Marks the entry as recently used."""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: dict) -> None:
+        blob = json.dumps(value, ensure_ascii=False)
+        size = len(blob.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, size, now, now),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._count += 0 if old else 1
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def touch(self, key: str) -> None:
+        """Reset stored_at (e.g. after a successful revalidation)."""
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            db = self._db()
+            old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total -= old[0]
+                self._count -= 1
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries down to 90% of max_bytes. Caller holds the lock.
+
+        Walks the accessed_at index from the oldest end and stops as soon as enough
+        is freed, instead of reading every row.
+        """
+        target = int(self.max_bytes * 0.9)
+        db = self._db()
+        freed = 0
+        victims = []
+        cur = db.execute("SELECT key, size FROM entries ORDER BY accessed_at")
+        for key, size in cur:
+            if self._total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        cur.close()
+        db.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._total -= freed
+        self._count -= len(victims)
+
+    def info(self) -> dict:
+        with self._lock:
+            self._db()
+            return {"entries": self._count, "bytes": self._total}
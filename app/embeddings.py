@@ -0,0 +1,152 @@
+"""Memo embeddings for semantic search and /similar (pgvector, 256 dims).
+
+Providers (EMBEDDINGS_PROVIDER):
+  hash   — deterministic local feature-hashed n-gram vectors (default; no network)
+  openai — OpenAI embeddings API (text-embedding-3-*, shortened to 256 dims)
+  off    — no embeddings; semantic search and /similar are unavailable
+
+Every stored vector records its provider/model in `embedding_model`, so a
+provider switch never compares vectors from different spaces. Re-embed rows
+from another (or no) model with:
+
+    python -m app.embeddings --backfill
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+from collections import Counter
+
+import httpx
+
+from .config import EMBEDDINGS_PROVIDER, OPENAI_API_KEY, OPENAI_EMBED_MODEL
+from .tokens import grams
+
+log = logging.getLogger(__name__)
+
+EMBED_DIM = 256  # must match memos.embedding vector(256)
+_MAX_TEXT_CHARS = 4000
+
+
+class HashEmbedder:
+    """Feature hashing of Hangul bigrams + words into EMBED_DIM signed buckets.
+
+    Sublinear term frequency, L2-normalized, so cosine similarity is a
+    bag-of-n-grams overlap score. Same text -> same vector on every machine.
+    """
+
+    model = f"hash-ngram-{EMBED_DIM}"
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed_one(t) for t in texts]
+
+    def _embed_one(self, text: str) -> list[float]:
+        vec = [0.0] * EMBED_DIM
+        for token, tf in Counter(grams(text).split()).items():
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+            vec[h % EMBED_DIM] += (1.0 + math.log(tf)) * (1 if h >> 63 else -1)
+        norm = math.sqrt(sum(v * v for v in vec))
+        return [v / norm for v in vec] if norm else vec
+
+
+class OpenAIEmbedder:
+    model = f"openai:{OPENAI_EMBED_MODEL}:{EMBED_DIM}"
+
+    def __init__(self):
+        if not OPENAI_API_KEY:
+            raise RuntimeError("EMBEDDINGS_PROVIDER=openai needs OPENAI_API_KEY")
+        self._client = httpx.Client(
+            base_url="https://api.openai.com/v1",
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+            timeout=30,
+        )
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        resp = self._client.post(
+            "/embeddings",
+            json={"model": OPENAI_EMBED_MODEL, "input": texts, "dimensions": EMBED_DIM},
+        )
+        resp.raise_for_status()
+        data = sorted(resp.json()["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+
+_PROVIDERS = {"hash": HashEmbedder, "openai": OpenAIEmbedder}
+_embedder = None
+
+
+def get_embedder():
+    """The configured embedder, or None when EMBEDDINGS_PROVIDER=off."""
+    global _embedder
+    if _embedder is None and EMBEDDINGS_PROVIDER != "off":
+        _embedder = _PROVIDERS[EMBEDDINGS_PROVIDER]()
+    return _embedder
+
+
+def memo_text(memo: dict) -> str:
+    """Text a memo is embedded from: title, tags, bullets, then the start of raw_content."""
+    parts = [
+        memo.get("title") or "",
+        " ".join(memo.get("tags") or []),
+        " ".join(memo.get("summary_bullets") or []),
+        memo.get("raw_content") or "",
+    ]
+    return "\n".join(p for p in parts if p)[:_MAX_TEXT_CHARS]
+
+
+def embed_memo(memo: dict) -> dict:
+    """{"embedding", "embedding_model"} for a memo about to be saved ({} if disabled or failed)."""
+    embedder = get_embedder()
+    if embedder is None:
+        return {}
+    try:
+        vec = embedder.embed([memo_text(memo)])[0]
+    except Exception:
+        log.exception("Embedding failed; memo saved without a vector (backfill will fill it)")
+        return {}
+    return {"embedding": vec, "embedding_model": embedder.model}
+
+
+def embed_query(query: str) -> tuple[list[float], str] | None:
+    """(vector, model) for a search query, or None when embeddings are off."""
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    return embedder.embed([query])[0], embedder.model
+
+
+def main() -> None:
+    import argparse
+
+    from . import supabase_client
+
+    ap = argparse.ArgumentParser(prog="python -m app.embeddings", description="Compute memo embeddings.")
+    ap.add_argument("--backfill", action="store_true", help="embed memos missing a vector for the current model")
+    ap.add_argument("--chunk", type=int, default=100, help="memos per embedding request / DB write")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not args.backfill:
+        ap.print_help()
+        return
+    embedder = get_embedder()
+    if embedder is None:
+        raise SystemExit("EMBEDDINGS_PROVIDER=off")
+
+    done = 0
+    after_id = None
+    while True:
+        memos = supabase_client.select_memos_for_embedding(embedder.model, after_id=after_id, limit=args.chunk)
+        if not memos:
+            break
+        vectors = embedder.embed([memo_text(m) for m in memos])
+        done += supabase_client.set_memo_embeddings(
+            [{"id": m["id"], "embedding": v} for m, v in zip(memos, vectors)], embedder.model,
+        )
+        after_id = memos[-1]["id"]
+        log.info("embedded %d memos", done)
+    log.info("embedding backfill done: %d memos (%s)", done, embedder.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,57 @@
 """Lightweight URL content extractor."""
 from __future__ import annotations
 
+import asyncio
+import os
 import re
-import httpx
-from .config import MAX_EXTRACT_CHARS
-
+import time
+from urllib.parse import urlsplit
 
-def extract_text(url: str) -> tuple[str, str]:
+import httpx
+from .config import (
+    CACHE_DIR,
+    EXTRACT_CACHE_MAX_MB,
+    EXTRACT_CACHE_TTL,
+    MAX_EXTRACT_CHARS,
+    MAX_FETCH_BYTES,
+)
+from .disk_cache import DiskCache
+from .html_text import HtmlTextExtractor
+from .urls import canonicalize
+
+_USER_AGENT = "MemoBot/1.0"
+_TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# URL -> {"text", "validators"}; bounded by size, LRU-evicted
+_cache = DiskCache(os.path.join(CACHE_DIR, "extract.sqlite3"), max_bytes=EXTRACT_CACHE_MAX_MB * 1024 * 1024)
+_stats = {"hit": 0, "miss": 0, "stale": 0, "revalidated": 0, "stale_if_error": 0}
+
+# Process-wide pooled client: keep-alive + HTTP/2 so repeat hosts skip DNS/TCP/TLS setup.
+_client: httpx.AsyncClient | None = None
+
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=httpx.Timeout(15, connect=5),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            headers={"User-Agent": _USER_AGENT},
+        )
+    return _client
+
+
+async def aclose() -> None:
+    """Close the pooled HTTP client (call on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def extract_text(url: str) -> tuple[str, str]:
     """Fetch URL and return (source_type, trimmed_text).
 
     source_type: 'web' | 'x' | 'instagram'
@@ -14,31 +59,131 @@ def extract_text(url: str) -> tuple[str, str]:
     Twitter/X URLs are fetched via FxTwitter API (no API key required).
     """
     source_type = _detect_source(url)
+    text = await _cached_fetch(url, source_type)
+
+    # Fallback: if extracted text is too short, use URL + meta description
+    if len(text.strip()) < 30:
+        text = f"URL: {url} (콘텐츠를 직접 추출할 수 없습니다. URL 정보만으로 분석해주세요.)"
+
+    return source_type, text
+
+
+async def _cached_fetch(url: str, source_type: str) -> str:
+    """Return extracted text for url, served from the on-disk cache when possible.
+
+    Fresh entries (younger than EXTRACT_CACHE_TTL) skip the network entirely;
+    stale ones are revalidated with If-None-Match / If-Modified-Since.
+    Empty results (fetch errors, auth walls) are never cached; if a stale
+    entry exists, its text is served instead.
+    """
+    entry = await asyncio.to_thread(_cache.get, url) if EXTRACT_CACHE_TTL > 0 else None
+    validators: dict = {}
+    if entry:
+        cached, stored_at = entry
+        if time.time() - stored_at < EXTRACT_CACHE_TTL:
+            _stats["hit"] += 1
+            return cached["text"]
+        validators = cached.get("validators") or {}
 
     if source_type == "x":
-        text = _fetch_twitter(url)
+        text, new_validators = await _fetch_twitter(url), {}
     else:
         try:
-            resp = httpx.get(url, follow_redirects=True, timeout=15,
-                             headers={"User-Agent": "MemoBot/1.0"})
-            resp.raise_for_status()
-            text = _strip_html(resp.text)[:MAX_EXTRACT_CHARS]
+            text, new_validators = await _fetch_page(url, validators)
         except Exception:
-            text = ""
+            text, new_validators = "", {}
+
+    if text is None and entry:
+        # 304 Not Modified: cached text is still current
+        _stats["revalidated"] += 1
+        await asyncio.to_thread(_cache.touch, url)
+        return cached["text"]
+    if text is None:
+        # 304 with nothing cached to revalidate (entry evicted meanwhile): a miss
+        text = ""
+
+    if entry and not text:
+        # Revalidation failed (network error, 5xx, auth wall): the stale copy beats nothing
+        _stats["stale_if_error"] += 1
+        return cached["text"]
+
+    _stats["stale" if entry else "miss"] += 1
+    if text and EXTRACT_CACHE_TTL > 0:
+        await asyncio.to_thread(_cache.set, url, {"text": text, "validators": new_validators})
+    return text
 
-    # Fallback: if extracted text is too short, use URL + meta description
-    if len(text.strip()) < 30:
-        text = f"URL: {url} (콘텐츠를 직접 추출할 수 없습니다. URL 정보만으로 분석해주세요.)"
 
-    return source_type, text
+def cache_stats() -> dict:
+    """Extraction cache counters since process start, plus current size."""
+    lookups = sum(_stats.values())
+    served = _stats["hit"] + _stats["revalidated"] + _stats["stale_if_error"]
+    return {
+        **_stats,
+        "hit_rate": f"{served / lookups:.0%}" if lookups else "-",
+        **_cache.info(),
+    }
 
 
-def _fetch_twitter(url: str) -> str:
+async def _fetch_page(url: str, validators: dict | None = None) -> tuple[str | None, dict]:
+    """Stream the page body and stop once MAX_EXTRACT_CHARS of text are collected.
+
+    HTML is parsed incrementally (see html_text) so main content is preferred and
+    boilerplate subtrees are dropped while the body is still downloading.
+
+    Returns (text, validators); text is None when the server answered 304 to
+    the conditional request built from `validators` (etag / last_modified).
+    Non-text content types are rejected without reading the body, and at most
+    MAX_FETCH_BYTES are downloaded regardless of what the server sends.
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    async with _http().stream("GET", url, headers=headers) as resp:
+        if resp.status_code == 304:
+            return None, validators or {}
+        resp.raise_for_status()
+        new_validators = {
+            k: v for k, v in (
+                ("etag", resp.headers.get("etag")),
+                ("last_modified", resp.headers.get("last-modified")),
+            ) if v
+        }
+        ctype = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+        if ctype and ctype not in _TEXT_TYPES:
+            return "", {}
+        is_html = ctype != "text/plain"
+
+        if is_html:
+            parser = HtmlTextExtractor(MAX_EXTRACT_CHARS)
+            async for chunk in resp.aiter_text():
+                parser.feed(chunk)
+                if parser.done or resp.num_bytes_downloaded >= MAX_FETCH_BYTES:
+                    break
+            parser.close()
+            text = parser.text()
+        else:
+            chunks: list[str] = []
+            size = 0
+            async for chunk in resp.aiter_text():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= MAX_EXTRACT_CHARS or resp.num_bytes_downloaded >= MAX_FETCH_BYTES:
+                    break
+            text = re.sub(r"\s+", " ", "".join(chunks)).strip()
+
+    return text[:MAX_EXTRACT_CHARS], new_validators
+
+
+async def _fetch_twitter(url: str) -> str:
     """Fetch tweet content via FxTwitter API (api.fxtwitter.com). No API key needed."""
-    fx_url = re.sub(r"https?://(twitter\.com|x\.com)", "https://api.fxtwitter.com", url)
+    # canonicalize() folds twitter.com / mobile.x.com / fxtwitter ... into x.com
+    fx_url = re.sub(r"^https://x\.com(?:/i(?=/status/))?", "https://api.fxtwitter.com", canonicalize(url))
     try:
-        resp = httpx.get(fx_url, follow_redirects=True, timeout=15,
-                         headers={"User-Agent": "MemoBot/1.0"})
+        resp = await _http().get(fx_url)
         resp.raise_for_status()
         data = resp.json()
         tweet = data.get("tweet", {})
@@ -89,17 +234,10 @@ def _fetch_twitter(url: str) -> str:
 
 
 def _detect_source(url: str) -> str:
-    if re.search(r"(twitter\.com|x\.com)", url):
+    host = urlsplit(canonicalize(url)).hostname or ""
+    if host == "x.com":
         return "x"
-    if "instagram.com" in url:
+    if host == "instagram.com":
         return "instagram"
     return "web"
 
-
-def _strip_html(html: str) -> str:
-    """Naive HTML tag removal."""
-    text = re.sub(r"<script[^>]*>.*?</script>", "", html, flags=re.S)
-    text = re.sub(r"<style[^>]*>.*?</style>", "", text, flags=re.S)
-    text = re.sub(r"<[^>]+>", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
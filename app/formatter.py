@@ -98,9 +98,31 @@ def fmt_search(data: dict) -> str:
 def fmt_delete(data: dict) -> str:
     ok = data.get("success", False)
     mid = data.get("memo_id", "?")
+    if data.get("ambiguous"):
+        return f"🗑 `{mid}` 로 시작하는 메모가 여러 개예요. ID를 조금 더 길게 입력해 주세요."
     return f"🗑 `{mid}` {'삭제 완료' if ok else '삭제 실패'}"
 
 
+def fmt_similar(data: dict) -> str:
+    mid = data.get("memo_id", "?")
+    if data.get("ambiguous"):
+        return f"🧭 `{mid}` 로 시작하는 메모가 여러 개예요. ID를 조금 더 길게 입력해 주세요."
+    memo = data.get("memo")
+    if not memo:
+        return f"🧭 `{mid}` 메모를 찾지 못했어요."
+    memos = data.get("memos", [])
+    if not memos:
+        return f"🧭 *{_esc(memo.get('title', ''))}* 와 비슷한 메모가 아직 없어요."
+    lines = [f"🧭 *{_esc(memo.get('title', ''))}* 와 비슷한 메모\n"]
+    for i, m in enumerate(memos, 1):
+        mid = m.get("id", "")
+        sim = m.get("similarity")
+        score = f" ({sim:.0%})" if isinstance(sim, (int, float)) else ""
+        url_part = f"\n   [🔗 바로가기]({_MEMO_WEB_BASE}/{mid})" if mid else ""
+        lines.append(f"{i}. *[{m.get('category', '')}] {_esc(m.get('title', ''))}*{score}{url_part}")
+    return "\n".join(lines)
+
+
 def fmt_category_list(data: dict) -> str:
     counts = data.get("counts", [])
     if not counts:
@@ -118,8 +140,16 @@ def fmt_category(data: dict) -> str:
     cat = data.get("category", "")
     if not memos:
         return f"📂 `{cat}` 카테고리에 메모가 없습니다."
-    lines = [f"📂 *카테고리: {_esc(cat)}* ({len(memos)}개)\n"]
-    for i, m in enumerate(memos, 1):
+    page = data.get("page", 0)
+    page_size = data.get("page_size", len(memos))
+    total = data.get("total")
+    if page > 0 or data.get("next_cursor"):
+        pages = f"/{max(1, math.ceil(total / page_size))}" if total else ""
+        page_info = f" ({page + 1}{pages}페이지, 총 {total}개)" if total else f" ({page + 1}페이지)"
+    else:
+        page_info = f" ({len(memos)}개)"
+    lines = [f"📂 *카테고리: {_esc(cat)}*{page_info}\n"]
+    for i, m in enumerate(memos, page * page_size + 1):
         mid = m.get('id', '')
         url_part = f"\n   [🔗 바로가기]({_MEMO_WEB_BASE}/{mid})" if mid else ""
         lines.append(f"{i}. *{_esc(m.get('title',''))}*{url_part}")
@@ -169,8 +199,9 @@ def fmt_recommend(data: dict) -> str:
 
 
 def fmt_duplicate(data: dict) -> str:
+    headline = "거의 같은 내용이 이미 저장돼 있어요!" if data.get("near") else "이미 저장된 메모입니다!"
     return (
-        f"📚 *이미 저장된 메모입니다!*\n"
+        f"📚 *{headline}*\n"
         f"제목: `{data.get('existing_title', '')}`\n"
         f"ID: `{data.get('existing_id', '')}`"
     )
@@ -190,6 +221,8 @@ def fmt_help() -> str:
 
 🔎 찾기
 • /search 키워드 → 메모 검색
+• /search ~질문 → 뜻으로 찾기 (의미 검색)
+• /similar id → 비슷한 메모 보기
 • /list → 최근 메모 보기
 • /category 이름 → 카테고리별 보기
 • /recommend → 랜덤 메모 추천
@@ -201,10 +234,21 @@ def fmt_help() -> str:
 💬 기타
 • /sms → 한 마디 잡담
 • /weather → 오늘 날씨 한 마디
+• /stats → 캐시·내부 통계
 """
     )
 
 
+def fmt_stats(data: dict) -> str:
+    """Internal counters per subsystem (/stats)."""
+    lines = ["📊 *내부 통계*"]
+    for section, counters in data.items():
+        lines.append(f"\n*{_esc(section)}*")
+        for k, v in counters.items():
+            lines.append(f"  • {_esc(str(k))}: `{v}`")
+    return "\n".join(lines)
+
+
 def fmt_verbose_step(stage: str, data: dict) -> str:
     """Verbose mode: show intermediate stage output."""
     import json
@@ -214,26 +258,48 @@ def fmt_verbose_step(stage: str, data: dict) -> str:
     return f"🔧 *[{stage}]*\n```json\n{preview}\n```"
 
 
+_CALLBACK_MAX_BYTES = 64  # Telegram callback_data limit
+
+
 def build_page_keyboard(
-    action: str, page: int, total: int, page_size: int, query: str | None = None,
+    action: str,
+    page: int,
+    total: int | None,
+    page_size: int,
+    query: str | None = None,
+    prev_cursor: str | None = None,
+    next_cursor: str | None = None,
+    category: str | None = None,
 ) -> InlineKeyboardMarkup | None:
-    """Build inline keyboard with prev/next buttons. Returns None if only 1 page."""
-    total_pages = max(1, math.ceil(total / page_size))
+    """Build inline keyboard with prev/next buttons. Returns None if only 1 page.
+
+    list/category are keyset-paged: callback_data carries the target page and
+    the boundary row's cursor ("list:{page}:{n|p}{cursor}",
+    "cat:{page}:{n|p}{cursor}:{category}"). search stays offset-paged.
+    """
+    if action in ("list", "category"):
+        targets = [
+            ("← 이전", page - 1, f"p{prev_cursor}" if prev_cursor else None),
+            ("다음 →", page + 1, f"n{next_cursor}" if next_cursor else None),
+        ]
+        buttons = []
+        for label, target, token in targets:
+            if not token:
+                continue
+            cb = f"cat:{target}:{token}:{category}" if action == "category" else f"list:{target}:{token}"
+            if len(cb.encode("utf-8")) > _CALLBACK_MAX_BYTES:
+                continue  # category name too long to carry in callback_data
+            buttons.append(InlineKeyboardButton(label, callback_data=cb))
+        return InlineKeyboardMarkup([buttons]) if buttons else None
+
+    total_pages = max(1, math.ceil((total or 0) / page_size))
     if total_pages <= 1:
         return None
     buttons = []
     if page > 0:
-        if action == "search" and query:
-            cb = f"search:{query}:{page - 1}"
-        else:
-            cb = f"list:{page - 1}"
-        buttons.append(InlineKeyboardButton("← 이전", callback_data=cb))
+        buttons.append(InlineKeyboardButton("← 이전", callback_data=f"search:{query}:{page - 1}"))
     if page < total_pages - 1:
-        if action == "search" and query:
-            cb = f"search:{query}:{page + 1}"
-        else:
-            cb = f"list:{page + 1}"
-        buttons.append(InlineKeyboardButton("다음 →", callback_data=cb))
+        buttons.append(InlineKeyboardButton("다음 →", callback_data=f"search:{query}:{page + 1}"))
     return InlineKeyboardMarkup([buttons]) if buttons else None
 
 
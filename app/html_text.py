@@ -0,0 +1,215 @@
+"""Incremental, main-content-aware HTML -> text extraction.
+
+Fed chunk by chunk while the page is still downloading. Prefers text inside
+<article>/<main>, prepends og:title/og:description (or <title>/meta description),
+and jumps over script/style/nav/footer/... subtrees with a single search for
+their closing tag instead of tokenizing them. `done` turns True once the
+character budget is filled so the caller can stop reading the body.
+"""
+from __future__ import annotations
+
+import html
+import re
+
+# Subtrees whose text is never kept. Form controls are skipped as leaves only:
+# <form> itself stays transparent, since whole pages (ASP.NET WebForms) live inside one.
+_SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "footer", "aside", "button", "select", "option", "textarea",
+}
+# <header> is page chrome at top level but usually holds the headline inside <article>
+_SKIP_OUTSIDE_MAIN = {"header"}
+# Raw-text elements: their content may contain '<' that is not markup
+_RAW_TAGS = {"script", "style", "textarea"}
+_MAIN_TAGS = {"article", "main"}
+# Main content shorter than this is treated as a stub and the page body is used instead
+_MIN_MAIN_CHARS = 200
+# Give up waiting for <article>/<main> after this many budgets of plain body text
+_BODY_LOOKAHEAD = 3
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w:-]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)(/?)>")
+_ATTR_RE = re.compile(r"([\w:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))")
+_WS_RE = re.compile(r"\s+")
+_TITLE_END_RE = re.compile(r"</title", re.I)
+_skip_res: dict[str, re.Pattern] = {}
+
+
+def _skip_re(tag: str) -> re.Pattern:
+    """Matches opening or closing `tag` (used to find the end of a skipped subtree)."""
+    pat = _skip_res.get(tag)
+    if pat is None:
+        pat = _skip_res[tag] = re.compile(rf"<(/?){tag}\b[^>]*>", re.I)
+    return pat
+
+
+class HtmlTextExtractor:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.done = False
+        self._buf = ""
+        self._meta: dict[str, str] = {}
+        self._title = ""
+        self._skip_tag: str | None = None
+        self._skip_depth = 0
+        self._main = 0
+        self._seen_main = False
+        self._main_parts: list[str] = []
+        self._main_len = 0
+        self._body_parts: list[str] = []
+        self._body_len = 0
+        self._body_seen = 0
+
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        buf = self._buf + data
+        pos = self._consume(buf)
+        self._buf = buf[pos:]
+
+    def close(self) -> None:
+        if self._buf and not self._skip_tag and not self.done:
+            self._text(self._buf)
+        self._buf = ""
+
+    def _consume(self, buf: str) -> int:
+        """Process as much of buf as possible; return the index of the unconsumed tail."""
+        pos = 0
+        n = len(buf)
+        while pos < n and not self.done:
+            if self._skip_tag:
+                pos = self._skip(buf, pos)
+                if self._skip_tag:
+                    return pos
+                continue
+
+            lt = buf.find("<", pos)
+            if lt < 0:
+                # Keep a trailing partial word/entity for the next chunk
+                cut = max(buf.rfind(" ", pos), buf.rfind(">", pos)) + 1
+                if cut > pos:
+                    self._text(buf[pos:cut])
+                    pos = cut
+                return pos
+            if lt > pos:
+                self._text(buf[pos:lt])
+                pos = lt
+
+            if buf.startswith("<!--", pos):
+                end = buf.find("-->", pos + 4)
+                if end < 0:
+                    return pos
+                pos = end + 3
+                continue
+            if buf.startswith("<!", pos) or buf.startswith("<?", pos):
+                end = buf.find(">", pos)
+                if end < 0:
+                    return pos
+                pos = end + 1
+                continue
+
+            m = _TAG_RE.match(buf, pos)
+            if m is None:
+                if buf.find(">", pos) < 0:
+                    return pos  # tag not complete yet
+                self._text("<")  # stray '<' in text
+                pos += 1
+                continue
+            closing, tag = m.group(1), m.group(2).lower()
+            if tag == "title" and not closing:
+                end = _TITLE_END_RE.search(buf, m.end())
+                if end is None:
+                    return pos  # wait for the rest of the title
+                self._title = self._title or " ".join(html.unescape(buf[m.end():end.start()]).split())
+                pos = end.start()
+                continue
+            pos = m.end()
+            if closing:
+                self._end(tag)
+            else:
+                self._start(tag, m.group(3), bool(m.group(4)))
+        return pos
+
+    def _skip(self, buf: str, pos: int) -> int:
+        pat = _skip_re(self._skip_tag)
+        last = pos
+        for m in pat.finditer(buf, pos):
+            last = m.end()
+            if m.group(1):
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+                    return last
+            elif self._skip_tag not in _RAW_TAGS and not m.group(0).endswith("/>"):
+                self._skip_depth += 1
+        # Closing tag not in this chunk: keep a tail that could hold a split "</tag"
+        return max(last, len(buf) - len(self._skip_tag) - 3)
+
+    def _start(self, tag: str, attrs: str, self_closing: bool) -> None:
+        if tag == "meta":
+            self._handle_meta(attrs)
+        elif self_closing:
+            return
+        elif tag in _SKIP_TAGS or (tag in _SKIP_OUTSIDE_MAIN and not self._main):
+            self._skip_tag = tag
+            self._skip_depth = 1
+        elif tag in _MAIN_TAGS:
+            self._main += 1
+            self._seen_main = True
+
+    def _end(self, tag: str) -> None:
+        if tag in _MAIN_TAGS and self._main:
+            self._main -= 1
+            if self._main_len >= self.budget:
+                self.done = True
+
+    def _text(self, raw: str) -> None:
+        if "&" in raw:
+            raw = html.unescape(raw)
+        text = _WS_RE.sub(" ", raw).strip()
+        if not text:
+            return
+        if self._main:
+            if self._main_len < self.budget:
+                self._main_parts.append(text)
+                self._main_len += len(text) + 1
+            else:
+                self.done = True
+        else:
+            if self._body_len < self.budget:
+                self._body_parts.append(text)
+                self._body_len += len(text) + 1
+            self._body_seen += len(text)
+            if not self._seen_main and self._body_seen >= self.budget * _BODY_LOOKAHEAD:
+                self.done = True
+
+    def _handle_meta(self, attrs: str) -> None:
+        a = {m.group(1).lower(): m.group(2) or m.group(3) or m.group(4) or "" for m in _ATTR_RE.finditer(attrs)}
+        key = (a.get("property") or a.get("name") or "").lower()
+        if key in ("og:title", "og:description", "description") and a.get("content"):
+            self._meta.setdefault(key, " ".join(html.unescape(a["content"]).split()))
+
+    def text(self) -> str:
+        """Title / description header followed by main content (or body fallback), within budget."""
+        title = self._meta.get("og:title") or self._title
+        desc = self._meta.get("og:description") or self._meta.get("description", "")
+        # Empty or stub <article>/<main>: fall back to the text collected around it
+        if self._main_len >= _MIN_MAIN_CHARS or (self._main_len and not self._body_len):
+            body = " ".join(self._main_parts)
+        else:
+            body = " ".join(self._body_parts)
+        parts = []
+        if title:
+            parts.append(title)
+        if desc and desc != title:
+            parts.append(desc)
+        if body:
+            parts.append(body)
+        return "\n".join(parts)[: self.budget]
+
+
+def extract_main_text(html_doc: str, budget: int) -> str:
+    """One-shot helper for an already-downloaded document."""
+    parser = HtmlTextExtractor(budget)
+    parser.feed(html_doc)
+    parser.close()
+    return parser.text()
@@ -0,0 +1,204 @@
+"""Bulk import of existing links: browser bookmark HTML, Pocket/Raindrop CSV, URL lists.
+
+Streams the input file and runs every URL through the normal save path
+(librarian dedup -> extractor -> near-duplicate check -> analyst -> librarian
+save) with bounded concurrency and a minimum interval between fetches to the
+same host.
+Finished URLs are appended to a state file, so re-running the same command
+resumes after an interruption (failed URLs are retried):
+
+    python -m app.import bookmarks.html --chat-id 123456789
+    python -m app.import pocket.csv --chat-id 123456789 --concurrency 24 --host-interval 2
+    python -m app.import urls.txt --chat-id 123456789 --state .cache/import_urls.done
+
+Memos are saved into the collection of --chat-id (the Telegram chat that owns them).
+Each URL costs two Claude calls (extract + analyze), so throughput is bounded by
+the Claude limiter, not by --concurrency: raise it for this process with
+--claude-concurrency (429s are retried with backoff).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import html
+import logging
+import os
+import re
+import time
+from typing import Iterator
+from urllib.parse import urlsplit
+
+from . import claude_client, extractor
+from .config import CACHE_DIR, CLAUDE_MAX_CONCURRENCY
+from .router import extract_url
+from .workers import analyst_analyze, analyst_extract, librarian_run
+
+log = logging.getLogger(__name__)
+
+_HREF_RE = re.compile(r"""<a\s[^>]*?href\s*=\s*["']([^"']+)["']""", re.I)
+_CSV_URL_COLUMNS = ("url", "link", "href", "given_url", "resolved_url")
+
+
+# ── Input parsing (streaming) ────────────────────────────────
+def _iter_bookmarks_html(f) -> Iterator[str]:
+    """Netscape bookmark format: one <DT><A HREF=...> per line."""
+    for line in f:
+        for href in _HREF_RE.findall(line):
+            yield html.unescape(href)
+
+
+def _iter_csv(f) -> Iterator[str]:
+    reader = csv.DictReader(f)
+    columns = {c.lower().strip(): c for c in reader.fieldnames or []}
+    key = next((columns[c] for c in _CSV_URL_COLUMNS if c in columns), None)
+    if key is None:
+        raise SystemExit(f"CSV has no URL column (looked for {', '.join(_CSV_URL_COLUMNS)})")
+    for row in reader:
+        yield (row.get(key) or "").strip()
+
+
+def _iter_lines(f) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield extract_url(line)
+
+
+def iter_urls(path: str, fmt: str | None = None) -> Iterator[str]:
+    """Yield http(s) URLs from the file without loading it into memory."""
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {".html": "html", ".htm": "html", ".csv": "csv"}.get(ext, "text")
+    parser = {"html": _iter_bookmarks_html, "csv": _iter_csv, "text": _iter_lines}[fmt]
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        for url in parser(f):
+            if url.startswith(("http://", "https://")):
+                yield url
+
+
+# ── Politeness ───────────────────────────────────────────────
+class _HostGate:
+    """Minimum interval between fetch starts per host (fetches themselves overlap freely)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last: dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        if self.interval <= 0:
+            return
+        host = (urlsplit(url).hostname or "").lower()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last.get(host, 0.0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = time.monotonic()
+
+
+# ── Import run ───────────────────────────────────────────────
+def _load_done(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n").split("\t", 1)[-1] for line in f if line.strip()}
+
+
+async def _import_one(chat_id: int, url: str, gate: _HostGate) -> str:
+    """Return 'saved' | 'duplicate'; raises on failure."""
+    dedup = await asyncio.to_thread(librarian_run, chat_id, f"dedup:{url}")
+    if dedup.get("action") == "duplicate":
+        return "duplicate"
+    await gate.wait(url)
+    prepared = await analyst_extract(url)
+    if prepared["simhash"] is not None:
+        near = await asyncio.to_thread(librarian_run, chat_id, f"neardup:{prepared['simhash']}")
+        if near.get("action") == "duplicate":
+            return "duplicate"
+    analyst_result = await analyst_analyze(prepared)
+    lib_result = await asyncio.to_thread(librarian_run, chat_id, "save:", analyst_result=analyst_result)
+    return lib_result.get("action", "saved")
+
+
+async def run(chat_id: int, path: str, fmt: str | None, state_path: str, concurrency: int,
+              host_interval: float, report_every: float) -> dict:
+    done = _load_done(state_path)
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    state = open(state_path, "a", encoding="utf-8")
+    gate = _HostGate(host_interval)
+    queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=concurrency * 2)
+    stats = {"saved": 0, "duplicate": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+
+    async def worker() -> None:
+        while (url := await queue.get()) is not None:
+            try:
+                status = await _import_one(chat_id, url, gate)
+            except Exception as e:
+                stats["failed"] += 1
+                log.warning("import failed %s: %s", url, e)
+            else:
+                stats[status] = stats.get(status, 0) + 1
+                state.write(f"{status}\t{url}\n")
+                state.flush()
+
+    async def reporter() -> None:
+        while True:
+            await asyncio.sleep(report_every)
+            handled = stats["saved"] + stats["duplicate"] + stats["failed"]
+            rate = handled / max(time.monotonic() - started, 1e-9) * 60
+            log.info("import progress: %s, %.0f URLs/min", stats, rate)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    report = asyncio.create_task(reporter())
+    seen: set[str] = set()
+    try:
+        for url in iter_urls(path, fmt):
+            if url in done or url in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(url)
+            await queue.put(url)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        report.cancel()
+        for w in workers:
+            w.cancel()
+        state.close()
+        await extractor.aclose()
+
+    elapsed = time.monotonic() - started
+    handled = stats["saved"] + stats["duplicate"] + stats["failed"]
+    return {**stats, "elapsed_s": round(elapsed, 1), "urls_per_min": round(handled / max(elapsed, 1e-9) * 60)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.import", description="Bulk-import links into meemoo.")
+    ap.add_argument("path", help="bookmark HTML, Pocket/Raindrop CSV, or a text file of URLs")
+    ap.add_argument("--chat-id", type=int, required=True, help="Telegram chat that owns the imported memos")
+    ap.add_argument("--format", choices=["html", "csv", "text"], help="default: by file extension")
+    ap.add_argument("--concurrency", type=int, default=16, help="URLs processed at once")
+    ap.add_argument(
+        "--claude-concurrency", type=int, default=CLAUDE_MAX_CONCURRENCY,
+        help="Claude requests in flight for this import (default: CLAUDE_MAX_CONCURRENCY)",
+    )
+    ap.add_argument("--host-interval", type=float, default=1.0, help="min seconds between fetches per host")
+    ap.add_argument("--report", type=float, default=10.0, help="progress log interval (seconds)")
+    ap.add_argument("--state", help="resume file (default: .cache/import_<chat>_<name>.done)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    claude_client.set_concurrency(args.claude_concurrency)
+    state_path = args.state or os.path.join(CACHE_DIR, f"import_{args.chat_id}_{os.path.basename(args.path)}.done")
+    summary = asyncio.run(run(
+        args.chat_id, args.path, args.format, state_path, args.concurrency, args.host_interval, args.report,
+    ))
+    log.info("import done: %s", summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """Telegram bot entry point."""
 from __future__ import annotations
 
+import asyncio
 import logging
 from datetime import datetime, timezone
 from telegram import InlineKeyboardMarkup, Update
@@ -14,10 +15,17 @@ from telegram.ext import (
 )
 
 from .config import TELEGRAM_TOKEN, VERBOSE_DEFAULT
-from .router import route
-from .workers import analyst_run, analyst_run_with_image, librarian_run, recommender_run, PAGE_SIZE
+from .router import extract_url, route
+from .workers import (
+    PAGE_SIZE,
+    analyst_analyze,
+    analyst_extract,
+    analyst_run_with_image,
+    librarian_run,
+    recommender_run,
+)
 from . import formatter as fmt
-from . import supabase_client
+from . import broadcast, claude_client, extractor, supabase_client
 from .scheduler import setup_scheduler, generate_weather_msg
 from .banter import maybe_banter
 
@@ -32,14 +40,45 @@ async def _send(update: Update, text: str, reply_markup: InlineKeyboardMarkup |
     await update.message.reply_text(text, parse_mode="Markdown", reply_markup=reply_markup)
 
 
+def _register_user(update: Update) -> None:
+    """Record the chat in the in-process registry; new/changed users are flushed in batches."""
+    user = update.effective_user
+    supabase_client.remember_user(update.effective_chat.id, user.username if user else None)
+
+
+def _keyset_keyboard(lib_result: dict) -> InlineKeyboardMarkup | None:
+    return fmt.build_page_keyboard(
+        lib_result["action"],
+        lib_result.get("page", 0),
+        lib_result.get("total"),
+        lib_result.get("page_size", PAGE_SIZE),
+        prev_cursor=lib_result.get("prev_cursor"),
+        next_cursor=lib_result.get("next_cursor"),
+        category=lib_result.get("category"),
+    )
+
+
+async def _reply_duplicate(update: Update, lib_result: dict, is_night: bool) -> None:
+    """Send the duplicate notice plus banter built from the stored memo."""
+    dup_banter = await maybe_banter({
+        "stage": "after_store", "intent": "duplicate",
+        "source_type": lib_result.get("source_type", ""),
+        "is_night": is_night, "duplicate": True,
+        "category": lib_result.get("existing_category", ""),
+        "tag_count": 0,
+        "title": lib_result.get("existing_title", ""),
+    })
+    await _send(update, fmt.fmt_duplicate(lib_result))
+    if dup_banter:
+        await update.message.reply_text(f"✏️ {dup_banter}")
+
+
 async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
     text = update.message.text or ""
     verbose = _verbose.get(chat_id, VERBOSE_DEFAULT)
 
-    # Register user on every message
-    user = update.effective_user
-    supabase_client.upsert_user(chat_id, user.username if user else None)
+    _register_user(update)
 
     action, payload = route(text)
     log.info("chat=%s action=%s payload=%s", chat_id, action, payload[:80])
@@ -58,7 +97,7 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
         if action == "sms":
             from .banter import generate_sms
             try:
-                msg = generate_sms()
+                msg = await generate_sms(priority=claude_client.PRIORITY_INTERACTIVE)
                 await update.message.reply_text(f"🧃 {msg}")
             except Exception as e:
                 log.exception("SMS banter failed")
@@ -67,13 +106,30 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
 
         if action == "weather":
             try:
-                msg = await generate_weather_msg()
+                msg = await generate_weather_msg(priority=claude_client.PRIORITY_INTERACTIVE)
                 await update.message.reply_text(f"🧃 {msg}")
             except Exception as e:
                 log.exception("Weather banter failed")
                 await _send(update, fmt.fmt_error(f"오류 발생: {e}"))
             return
 
+        if action == "stats":
+            stats = {
+                "extract_cache": extractor.cache_stats(),
+                "claude_cache": claude_client.cache_stats(),
+                "claude_limiter": claude_client.limiter_stats(),
+                "memo_writer": supabase_client.writer_stats(),
+                "memo_cache": supabase_client.cache_stats(),
+            }
+            pushes = broadcast.last_run_stats()
+            if pushes:
+                stats["broadcast"] = pushes
+            replica = supabase_client.replica_stats()
+            if replica is not None:
+                stats["search_replica"] = replica
+            await _send(update, fmt.fmt_stats(stats))
+            return
+
         if action == "unknown":
             await _send(update, fmt.fmt_error("알 수 없는 명령입니다. /help 를 확인하세요."))
             return
@@ -89,6 +145,7 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
                 "search": "📚 사서: 색인 뒤지는 중...",
                 "category": "📚 사서: 분류표 확인 중...",
                 "delete": "📚 사서: 기록 정리 중...",
+                "similar": "📚 사서: 비슷한 메모 찾는 중...",
             },
             "recommender": "💡 큐레이터: 연결 고리 탐색 중...",
         }
@@ -102,14 +159,33 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
             await _send(update, _status["recommender"])
 
         if action == "analyst":
-            # 🎯 Router -> 🔍 Analyst -> 📚 Librarian
-            analyst_result = analyst_run(payload)
+            # 🎯 Router -> 📚 Librarian (dedup) -> 🔍 Analyst (extract) -> 📚 Librarian (near-dup)
+            #   -> 🔍 Analyst (Claude) -> 📚 Librarian (save)
+            url = extract_url(payload)
+            if url:
+                lib_result = await asyncio.to_thread(librarian_run, chat_id, f"dedup:{url}")
+                if lib_result.get("action") == "duplicate":
+                    if verbose:
+                        await _send(update, fmt.fmt_verbose_step("📚 Librarian", lib_result))
+                    await _reply_duplicate(update, lib_result, is_night)
+                    return
+
+            prepared = await analyst_extract(payload)
+            if prepared["simhash"] is not None:
+                lib_result = await asyncio.to_thread(librarian_run, chat_id, f"neardup:{prepared['simhash']}")
+                if lib_result.get("action") == "duplicate":
+                    if verbose:
+                        await _send(update, fmt.fmt_verbose_step("📚 Librarian", lib_result))
+                    await _reply_duplicate(update, lib_result, is_night)
+                    return
+
+            analyst_result = await analyst_analyze(prepared)
             if verbose:
                 await _send(update, fmt.fmt_verbose_step("🔍 Analyst", analyst_result))
                 await _send(update, fmt.fmt_analyst(analyst_result))
 
             # 🎭 Banter after analysis
-            banter = maybe_banter({
+            banter = await maybe_banter({
                 "stage": "after_analysis", "intent": "save",
                 "source_type": analyst_result.get("source_type", ""),
                 "is_night": is_night, "duplicate": False,
@@ -120,22 +196,12 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
             if banter:
                 await update.message.reply_text(f"✏️ {banter}")
 
-            lib_result = librarian_run("save:", analyst_result=analyst_result)
+            lib_result = await asyncio.to_thread(librarian_run, chat_id, "save:", analyst_result=analyst_result)
             if verbose:
                 await _send(update, fmt.fmt_verbose_step("📚 Librarian", lib_result))
 
             if lib_result.get("action") == "duplicate":
-                dup_banter = maybe_banter({
-                    "stage": "after_store", "intent": "duplicate",
-                    "source_type": analyst_result.get("source_type", ""),
-                    "is_night": is_night, "duplicate": True,
-                    "category": analyst_result.get("category", ""),
-                    "tag_count": len(analyst_result.get("tags", [])),
-                    "title": analyst_result.get("title", ""),
-                })
-                await _send(update, fmt.fmt_duplicate(lib_result))
-                if dup_banter:
-                    await update.message.reply_text(f"✏️ {dup_banter}")
+                await _reply_duplicate(update, lib_result, is_night)
             else:
                 await _send(update, fmt.fmt_saved(lib_result))
                 if not verbose:
@@ -143,21 +209,22 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
             return
 
         if action == "librarian":
-            lib_result = librarian_run(payload)
+            lib_result = await asyncio.to_thread(librarian_run, chat_id, payload)
             if verbose:
                 await _send(update, fmt.fmt_verbose_step("📚 Librarian", lib_result))
 
             act = lib_result.get("action", "")
             if act == "list":
-                kb = fmt.build_page_keyboard("list", lib_result.get("page", 0), lib_result.get("total", 0), PAGE_SIZE)
-                await _send(update, fmt.fmt_list(lib_result), reply_markup=kb)
+                await _send(update, fmt.fmt_list(lib_result), reply_markup=_keyset_keyboard(lib_result))
             elif act == "search":
                 kb = fmt.build_page_keyboard("search", lib_result.get("page", 0), lib_result.get("total", 0), PAGE_SIZE, query=lib_result.get("query"))
                 await _send(update, fmt.fmt_search(lib_result), reply_markup=kb)
             elif act == "category_list":
                 await _send(update, fmt.fmt_category_list(lib_result))
             elif act == "category":
-                await _send(update, fmt.fmt_category(lib_result))
+                await _send(update, fmt.fmt_category(lib_result), reply_markup=_keyset_keyboard(lib_result))
+            elif act == "similar":
+                await _send(update, fmt.fmt_similar(lib_result))
             elif act == "delete":
                 await _send(update, fmt.fmt_delete(lib_result))
             else:
@@ -165,7 +232,7 @@ async def _handle(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
             return
 
         if action == "recommender":
-            rec_result = recommender_run(payload)
+            rec_result = await recommender_run(chat_id, payload)
             if verbose:
                 await _send(update, fmt.fmt_verbose_step("💡 Recommender", rec_result))
             await _send(update, fmt.fmt_recommend(rec_result))
@@ -180,8 +247,7 @@ async def _handle_photo(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle photo messages: download -> vision analysis -> save memo."""
     chat_id = update.effective_chat.id
     verbose = _verbose.get(chat_id, VERBOSE_DEFAULT)
-    user = update.effective_user
-    supabase_client.upsert_user(chat_id, user.username if user else None)
+    _register_user(update)
 
     caption = update.message.caption or ""
     log.info("chat=%s action=photo_analyst caption=%s", chat_id, caption[:80])
@@ -193,12 +259,12 @@ async def _handle_photo(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
         file = await ctx.bot.get_file(photo.file_id)
         file_bytes = bytes(await file.download_as_bytearray())
 
-        analyst_result = analyst_run_with_image(file_bytes, caption)
+        analyst_result = await analyst_run_with_image(file_bytes, caption)
         if verbose:
             await _send(update, fmt.fmt_verbose_step("🔍 Analyst", analyst_result))
             await _send(update, fmt.fmt_analyst(analyst_result))
 
-        banter = maybe_banter({
+        banter = await maybe_banter({
             "stage": "after_analysis", "intent": "save",
             "source_type": analyst_result.get("source_type", ""),
             "is_night": is_night, "duplicate": False,
@@ -209,7 +275,7 @@ async def _handle_photo(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
         if banter:
             await update.message.reply_text(f"✏️ {banter}")
 
-        lib_result = librarian_run("save:", analyst_result=analyst_result)
+        lib_result = await asyncio.to_thread(librarian_run, chat_id, "save:", analyst_result=analyst_result)
         if verbose:
             await _send(update, fmt.fmt_verbose_step("📚 Librarian", lib_result))
 
@@ -227,20 +293,25 @@ async def _page_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None
     query = update.callback_query
     await query.answer()
     data = query.data or ""
+    chat_id = update.effective_chat.id  # cursors and ids only resolve within this chat
 
     try:
         if data.startswith("list:"):
-            # "list:{page}"
-            page = int(data.split(":")[1])
-            lib_result = librarian_run(f"list:{page}")
+            # "list:{page}:{n|p}{cursor}"
+            lib_result = await asyncio.to_thread(librarian_run, chat_id, data)
             text = fmt.fmt_list(lib_result)
-            kb = fmt.build_page_keyboard("list", lib_result.get("page", 0), lib_result.get("total", 0), PAGE_SIZE)
+            kb = _keyset_keyboard(lib_result)
+        elif data.startswith("cat:"):
+            # "cat:{page}:{n|p}{cursor}:{category}"
+            lib_result = await asyncio.to_thread(librarian_run, chat_id, "category:" + data[len("cat:"):])
+            text = fmt.fmt_category(lib_result)
+            kb = _keyset_keyboard(lib_result)
         elif data.startswith("search:"):
             # "search:{query}:{page}"
             parts = data.split(":")
             page = int(parts[-1])
             search_query = ":".join(parts[1:-1])
-            lib_result = librarian_run(f"search:{search_query}:{page}")
+            lib_result = await asyncio.to_thread(librarian_run, chat_id, f"search:{search_query}:{page}")
             text = fmt.fmt_search(lib_result)
             kb = fmt.build_page_keyboard("search", lib_result.get("page", 0), lib_result.get("total", 0), PAGE_SIZE, query=search_query)
         else:
@@ -253,11 +324,30 @@ async def _page_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None
 
 
 async def _post_init(app: Application) -> None:
+    try:
+        n = await asyncio.to_thread(supabase_client.load_user_registry)
+        log.info("Loaded %d known users", n)
+    except Exception:
+        log.exception("Loading user registry failed; users will be re-registered on first message")
     setup_scheduler(app)
 
 
+async def _post_shutdown(app: Application) -> None:
+    await asyncio.to_thread(supabase_client.flush_writes)
+    await asyncio.to_thread(supabase_client.flush_users)
+    await extractor.aclose()
+
+
 def main() -> None:
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(_post_init).build()
+    # concurrent_updates: let slow saves (page fetch + Claude) overlap instead of queueing every chat
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
     app.add_handler(CommandHandler("help", _handle))
     app.add_handler(CommandHandler("start", _handle))
     app.add_handler(CommandHandler("save", _handle))
@@ -265,11 +355,13 @@ def main() -> None:
     app.add_handler(CommandHandler("search", _handle))
     app.add_handler(CommandHandler("category", _handle))
     app.add_handler(CommandHandler("delete", _handle))
+    app.add_handler(CommandHandler("similar", _handle))
     app.add_handler(CommandHandler("recommend", _handle))
     app.add_handler(CommandHandler("verbose", _handle))
     app.add_handler(CommandHandler("sms", _handle))
     app.add_handler(CommandHandler("weather", _handle))
-    app.add_handler(CallbackQueryHandler(_page_callback, pattern=r"^(list|search):"))
+    app.add_handler(CommandHandler("stats", _handle))
+    app.add_handler(CallbackQueryHandler(_page_callback, pattern=r"^(list|search|cat):"))
     app.add_handler(MessageHandler(filters.PHOTO, _handle_photo))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _handle))
     log.info("Bot started")
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import re
 from .schemas import ROUTE_COMMANDS
+from .urls import URL_RE, clean_url
 
 
 def route(text: str) -> tuple[str, str]:
@@ -31,7 +32,7 @@ def route(text: str) -> tuple[str, str]:
         return "analyst", text
 
     # Text containing URL -> analyst (save with context)
-    url_match = re.search(r"https?://\S+", text)
+    url_match = URL_RE.search(text)
     if url_match:
         return "analyst", text
 
@@ -44,3 +45,28 @@ def route(text: str) -> tuple[str, str]:
         return "analyst", text
 
     return "unknown", text
+
+
+def split_url(text: str) -> tuple[str, str]:
+    """Split an analyst payload into (url, the rest of the text); url is '' if none.
+
+    Bare domains (e.g. griddyicons.com) are returned with https:// prepended.
+    Tracking parameters (utm_*, fbclid, ...) and the fragment are dropped from
+    the URL; the rest is the payload minus the URL exactly as it was typed.
+    The dedup key is urls.canonicalize() of the URL.
+    """
+    url_match = URL_RE.search(text)
+    if url_match:
+        url = clean_url(url_match.group(0))
+    else:
+        url_match = re.search(r"\b([\w-]+\.(?:com|net|org|io|co|dev|ai|kr|me|app|xyz))\b", text, re.I)
+        if not url_match:
+            return "", text.strip()
+        url = f"https://{url_match.group(1)}"
+    start, end = url_match.span()
+    return url, (text[:start] + text[end:]).strip()
+
+
+def extract_url(text: str) -> str:
+    """Pull the URL out of an analyst payload ('' if none). See split_url."""
+    return split_url(text)[0]
@@ -1,25 +1,24 @@
 """Scheduled jobs: morning greeting + memo recommendations."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import random
-from datetime import date
+from datetime import date, datetime, timezone
 
 import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from telegram.ext import Application
 
-from . import supabase_client, formatter as fmt
-from .workers import recommender_run
-from anthropic import AsyncAnthropic
-from .config import ANTHROPIC_API_KEY, CLAUDE_MODEL
+from . import broadcast, claude_client, supabase_client, formatter as fmt
+from .config import SEARCH_REPLICA, SEARCH_REPLICA_SYNC_SECONDS
+from .workers import recommender_run, stored_recommendation
 from .schemas import CHARACTER_RULES
 
-_anthropic = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
-
 log = logging.getLogger(__name__)
 
 RECOMMEND_HOURS = [9, 20]  # 오전 9시, 오후 8시
+USER_FLUSH_SECONDS = 10
 
 # 대한민국 주요 공휴일/기념일 (월, 일) -> 이름
 KR_HOLIDAYS = {
@@ -125,26 +124,30 @@ def _get_date_info() -> str:
     return base
 
 
-async def generate_weather_msg() -> str:
+# Static (prompt-cached) system prompt; the speaker is passed in the user message.
+_WEATHER_SYSTEM = (
+    "You are 케미담당(💖). Output EXACTLY one line of casual Korean. "
+    "No quotes, no extra lines, no explanations. "
+    "The speaker is fixed by the `speaker` field. Use ONLY '<speaker>:' as prefix. "
+    "날씨 정보(기후·최저·최고온도)를 캐릭터 말투로 자연스럽게 녹여서 말하고, "
+    "마지막에 오늘 날씨에 맞는 짧은 조언이나 감상 한 마디를 덧붙여. "
+    "기념일이 있으면 언급해줘. "
+) + CHARACTER_RULES
+
+
+async def generate_weather_msg(priority: int = claude_client.PRIORITY_BACKGROUND) -> str:
     """Generate weather message via Claude in character voice. Used by morning job & /weather."""
     date_info = _get_date_info()
     weather = await _get_weather_mapo()
 
     speaker = random.choice(["팀장", "분석가", "사서"])
-    resp = await _anthropic.messages.create(
-        model=CLAUDE_MODEL,
+    return await claude_client.ask_text(
+        _WEATHER_SYSTEM,
+        f"speaker={speaker}\n날짜: {date_info}\n날씨(마포구): {weather}",
         max_tokens=100,
-        system=(
-            "You are 케미담당(💖). Output EXACTLY one line of casual Korean. "
-            "No quotes, no extra lines, no explanations. "
-            f"The speaker is fixed as {speaker}:. Use ONLY '{speaker}:' as prefix. "
-            "날씨 정보(기후·최저·최고온도)를 캐릭터 말투로 자연스럽게 녹여서 말하고, "
-            "마지막에 오늘 날씨에 맞는 짧은 조언이나 감상 한 마디를 덧붙여. "
-            "기념일이 있으면 언급해줘. "
-        ) + CHARACTER_RULES,
-        messages=[{"role": "user", "content": f"날짜: {date_info}\n날씨(마포구): {weather}"}],
+        label="weather",
+        priority=priority,
     )
-    return resp.content[0].text.strip().split("\n")[0].strip()
 
 
 def setup_scheduler(app: Application) -> AsyncIOScheduler:
@@ -173,54 +176,90 @@ def setup_scheduler(app: Application) -> AsyncIOScheduler:
             id=f"recommend_{hour}",
             replace_existing=True,
         )
+    # Batched writes of new/renamed users from the in-process registry
+    scheduler.add_job(
+        _flush_users,
+        "interval",
+        seconds=USER_FLUSH_SECONDS,
+        id="flush_users",
+        replace_existing=True,
+    )
+    if SEARCH_REPLICA:
+        # First run right away: search stays on Supabase until the replica is synced
+        scheduler.add_job(
+            _sync_search_replica,
+            "interval",
+            seconds=SEARCH_REPLICA_SYNC_SECONDS,
+            next_run_time=datetime.now(timezone.utc),
+            id="sync_search_replica",
+            replace_existing=True,
+        )
     scheduler.start()
     log.info("Scheduler started: morning=6, recommendations=%s KST", RECOMMEND_HOURS)
     return scheduler
 
 
-async def _push_morning(app: Application) -> None:
-    """Send morning greeting with weather to all users."""
-    users = supabase_client.list_users()
-    if not users:
+async def _flush_users() -> None:
+    try:
+        n = await asyncio.to_thread(supabase_client.flush_users)
+    except Exception:
+        log.exception("User registry flush failed (will retry)")
         return
+    if n:
+        log.info("Flushed %d user registrations", n)
 
+
+async def _sync_search_replica() -> None:
     try:
-        msg = await generate_weather_msg()
+        n = await asyncio.to_thread(supabase_client.sync_search_replica)
     except Exception:
-        log.exception("Morning greeting generation failed")
+        log.exception("Search replica sync failed (will retry)")
         return
+    if n:
+        log.info("Search replica: %d rows synced", n)
 
-    bot = app.bot
-    for u in users:
-        try:
-            await bot.send_message(u["chat_id"], f"🧃 {msg}")
-        except Exception:
-            log.warning("Failed to send morning to chat_id=%s", u["chat_id"])
 
-
-async def _push_recommendations(app: Application) -> None:
-    """전체 메모 중 랜덤 1개를 Claude 거쳐 모든 유저에게 전송."""
-    users = supabase_client.list_users()
+async def _push_morning(app: Application) -> None:
+    """Send morning greeting with weather to all users."""
+    users = await asyncio.to_thread(supabase_client.list_users)
     if not users:
         return
 
-    memo = supabase_client.get_one_random_memo()
-    if not memo:
-        return
-
     try:
-        result = recommender_run("", memos=[memo])
+        msg = await generate_weather_msg(priority=claude_client.PRIORITY_BACKGROUND)
     except Exception:
-        log.exception("Scheduled recommend failed")
+        log.exception("Morning greeting generation failed")
         return
 
-    text = fmt.fmt_recommend(result)
-    if not text or "아직 없" in text:
+    await broadcast.broadcast(app.bot, [u["chat_id"] for u in users], f"🧃 {msg}", label="morning")
+
+
+async def _push_recommendations(app: Application) -> None:
+    """유저마다 자기 메모 중 랜덤 1개를 Claude 큐레이터 거쳐 전송 (실패 시 저장된 요약으로)."""
+    users = await asyncio.to_thread(supabase_client.list_users)
+    if not users:
         return
 
-    bot = app.bot
-    for u in users:
+    async def one(chat_id: int) -> str | None:
+        try:
+            memo = await asyncio.to_thread(supabase_client.get_one_random_memo, chat_id)
+        except Exception:
+            log.exception("Scheduled recommend failed for chat_id=%s", chat_id)
+            return None
+        if not memo:
+            return None
         try:
-            await bot.send_message(u["chat_id"], text, parse_mode="Markdown")
+            result = await recommender_run(chat_id, "", memos=[memo], priority=claude_client.PRIORITY_BACKGROUND)
         except Exception:
-            log.warning("Failed to send to chat_id=%s", u["chat_id"])
+            log.exception("Scheduled recommend curation failed for chat_id=%s; sending stored summary", chat_id)
+            result = stored_recommendation(memo)
+        text = fmt.fmt_recommend(result)
+        return None if not text or "아직 없" in text else text
+
+    # All curations are generated before the send; Claude calls queue on the shared
+    # limiter at background priority, and a memo seen in an earlier run hits the result cache
+    chat_ids = [u["chat_id"] for u in users]
+    texts = await asyncio.gather(*(one(c) for c in chat_ids))
+    messages = {c: t for c, t in zip(chat_ids, texts) if t}
+    if messages:
+        await broadcast.send_each(app.bot, messages, label="recommend", parse_mode="Markdown")
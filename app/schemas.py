@@ -93,10 +93,12 @@ ROUTE_COMMANDS = {
     "search": "librarian",
     "category": "librarian",
     "delete": "librarian",
+    "similar": "librarian",
     "recommend": "recommender",
     "verbose": "setting",
     "sms": "sms",
     "weather": "weather",
+    "stats": "stats",
     "help": "help",
     "start": "help",
 }
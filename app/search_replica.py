@@ -0,0 +1,188 @@
+"""Local SQLite FTS5 replica of memo search fields (stdlib only).
+
+Hangul has no spaces inside compounds ("에이전트설계"), so the unicode61
+tokenizer alone only matches whole eojeol. Text is pre-tokenized with
+app.tokens instead: Hangul runs become overlapping character bigrams, other
+words stay whole. A Hangul query matches as a phrase of its bigrams (a
+substring match), other query words as prefixes, and results are ranked by
+bm25 with title > tags > body.
+
+The replica is fed by supabase_client (rows returned from saves, deletes,
+and a periodic created_at watermark sync). Rebuild from scratch with:
+
+    python -m app.search_replica --rebuild
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+
+from .tokens import grams, hangul_grams, is_hangul, words
+
+# Columns returned by search, same shape as the search_memos RPC rows
+ROW_FIELDS = ("id", "title", "summary_bullets", "category", "tags", "source_url", "source_type", "created_at")
+
+# bm25 column weights: title, tags, body
+_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def match_query(query: str) -> str | None:
+    """FTS5 MATCH expression for a user query (None if it has no searchable token)."""
+    terms = []
+    for tok in words(query):
+        if is_hangul(tok) and len(tok) > 1:
+            terms.append('"' + " ".join(hangul_grams(tok)) + '"')
+        else:
+            terms.append(f'"{tok}"*')
+    return " AND ".join(terms) or None
+
+
+def _index_fields(row: dict) -> tuple[str, str, str]:
+    tags = " ".join(row.get("tags") or [])
+    body = " ".join([
+        row.get("category") or "",
+        " ".join(row.get("summary_bullets") or []),
+        row.get("raw_content") or "",
+    ])
+    return grams(row.get("title") or ""), grams(tags), grams(body)
+
+
+class SearchReplica:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(memos)")}
+            if columns and "chat_id" not in columns:
+                # Pre-partitioning replica: drop it (and its watermark) so the next sync rebuilds
+                conn.executescript("DROP TABLE memos; DROP TABLE IF EXISTS memo_fts; DROP TABLE IF EXISTS meta;")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS memos ("
+                " id TEXT UNIQUE NOT NULL, chat_id INTEGER NOT NULL, created_at TEXT NOT NULL, row TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_memos_chat ON memos (chat_id)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS memo_fts USING fts5(title, tags, body)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+        return self._conn
+
+    # ── Writes ───────────────────────────────────────────────
+    def upsert(self, rows) -> int:
+        """Insert or replace full memo rows (as returned by Supabase). Returns rows written."""
+        n = 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for r in rows:
+                    self._delete_one(db, r["id"])
+                    cur = db.execute(
+                        "INSERT INTO memos (id, chat_id, created_at, row) VALUES (?, ?, ?, ?)",
+                        (
+                            r["id"], r["chat_id"], r["created_at"],
+                            json.dumps({k: r.get(k) for k in ROW_FIELDS}, ensure_ascii=False),
+                        ),
+                    )
+                    db.execute(
+                        "INSERT INTO memo_fts (rowid, title, tags, body) VALUES (?, ?, ?, ?)",
+                        (cur.lastrowid, *_index_fields(r)),
+                    )
+                    n += 1
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return n
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            for memo_id in ids:
+                self._delete_one(db, memo_id)
+            db.execute("COMMIT")
+
+    @staticmethod
+    def _delete_one(db: sqlite3.Connection, memo_id: str) -> None:
+        row = db.execute("SELECT rowid FROM memos WHERE id = ?", (memo_id,)).fetchone()
+        if row:
+            db.execute("DELETE FROM memo_fts WHERE rowid = ?", row)
+            db.execute("DELETE FROM memos WHERE rowid = ?", row)
+
+    def clear(self) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM memo_fts")
+            db.execute("DELETE FROM memos")
+            db.execute("DELETE FROM meta")
+
+    # ── Sync watermark ───────────────────────────────────────
+    def watermark(self) -> str | None:
+        """created_at of the newest row seen by a full/periodic sync (None = never synced)."""
+        with self._lock:
+            row = self._db().execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, value: str) -> None:
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (value,))
+
+    @property
+    def ready(self) -> bool:
+        return self.watermark() is not None
+
+    # ── Reads ────────────────────────────────────────────────
+    def search(self, chat_id: int, query: str, limit: int = 5, offset: int = 0) -> tuple[list[dict], int]:
+        """Same (rows, total) shape as supabase_client.search_memos_text, for one chat's memos."""
+        expr = match_query(query)
+        if not expr:
+            return [], 0
+        with self._lock:
+            db = self._db()
+            total = db.execute(
+                "SELECT count(*) FROM memo_fts JOIN memos m ON m.rowid = memo_fts.rowid"
+                " WHERE memo_fts MATCH ? AND m.chat_id = ?",
+                (expr, chat_id),
+            ).fetchone()[0]
+            if not total:
+                return [], 0
+            rows = db.execute(
+                "SELECT m.row FROM memo_fts JOIN memos m ON m.rowid = memo_fts.rowid"
+                " WHERE memo_fts MATCH ? AND m.chat_id = ?"
+                " ORDER BY bm25(memo_fts, ?, ?, ?), m.created_at DESC LIMIT ? OFFSET ?",
+                (expr, chat_id, *_WEIGHTS, limit, offset),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows], total
+
+    def info(self) -> dict:
+        with self._lock:
+            n = self._db().execute("SELECT count(*) FROM memos").fetchone()[0]
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {"rows": n, "size_mb": round(size / 1024 / 1024, 1), "watermark": self.watermark() or "-"}
+
+
+def main() -> None:
+    import argparse
+    import logging
+
+    from . import supabase_client
+
+    ap = argparse.ArgumentParser(prog="python -m app.search_replica", description="Sync the local search replica.")
+    ap.add_argument("--rebuild", action="store_true", help="drop local rows and copy everything again")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    n = supabase_client.sync_search_replica(full=args.rebuild)
+    logging.getLogger(__name__).info("search replica synced: %d rows", n)
+
+
+if __name__ == "__main__":
+    main()
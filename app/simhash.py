@@ -0,0 +1,48 @@
+"""64-bit SimHash content fingerprints for near-duplicate detection.
+
+Features are 3-token shingles of app.tokens (Hangul bigrams + words), so an
+AMP page, a mirror or pasted text of the same article land within a few bits
+of each other. Lookups use LSH banding: the fingerprint is split into 4 bands
+of 16 bits, and any fingerprint within Hamming distance 3 shares at least one
+band exactly (pigeonhole), which an array index can find.
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+
+from .tokens import grams
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+MAX_DISTANCE = 3  # must stay < BANDS for the banding guarantee
+MIN_TOKENS = 40   # shorter texts give unstable fingerprints; skip them
+
+
+def simhash(text: str) -> int | None:
+    """Unsigned 64-bit fingerprint, or None if the text is too short to be meaningful."""
+    tokens = grams(text).split()
+    if len(tokens) < MIN_TOKENS:
+        return None
+    weights = [0] * 64
+    shingles = Counter(" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2))
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def bands(fp: int) -> list[int]:
+    """Band keys for the GIN-indexed simhash_bands column: band index in the high bits."""
+    mask = (1 << BAND_BITS) - 1
+    return [(i << BAND_BITS) | (fp >> (i * BAND_BITS) & mask) for i in range(BANDS)]
+
+
+def to_signed(fp: int) -> int:
+    """Postgres BIGINT is signed: store the same 64 bits as a two's-complement value."""
+    return fp - (1 << 64) if fp >= 1 << 63 else fp
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & ((1 << 64) - 1)).bit_count()
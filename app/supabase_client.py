@@ -1,40 +1,328 @@
 """Supabase client wrapper for memo CRUD."""
 from __future__ import annotations
 
-from supabase import create_client, Client
-from .config import SUPABASE_URL, SUPABASE_ANON_KEY
+import atexit
+import base64
+import copy
+import functools
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
 
+from supabase import create_client, Client
+from . import embeddings, search_replica, simhash, urls
+from .config import (
+    CACHE_DIR,
+    MEMO_CACHE_SIZE,
+    MEMO_CACHE_TTL,
+    MEMO_FLUSH_MS,
+    MEMO_FLUSH_SIZE,
+    SEARCH_REPLICA,
+    SUPABASE_ANON_KEY,
+    SUPABASE_URL,
+)
+
+log = logging.getLogger(__name__)
 _sb: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 TABLE = "memos"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class _ReadCache:
+    """Bounded LRU + TTL cache for memo reads.
+
+    Keys carry the data version, so bumping it (on any memo write) makes every
+    older entry unreachable; they age out through LRU eviction. Writes from
+    other processes (import / backfill CLIs) are only picked up after the TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self.stats = {"hit": 0, "miss": 0, "invalidations": 0}
+
+    def bump(self) -> None:
+        with self._lock:
+            self.version += 1
+            self.stats["invalidations"] += 1
+
+    def get(self, key: tuple) -> tuple[bool, object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hit"] += 1
+                return True, copy.deepcopy(entry[1])
+            if entry:
+                del self._entries[key]
+            self.stats["miss"] += 1
+            return False, None
+
+    def set(self, key: tuple, value: object) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hit"] + self.stats["miss"]
+        return {
+            **self.stats,
+            "hit_rate": f"{self.stats['hit'] / lookups:.0%}" if lookups else "-",
+            "entries": len(self._entries),
+            "version": self.version,
+        }
+
+
+_read_cache = _ReadCache(MEMO_CACHE_SIZE, MEMO_CACHE_TTL)
+
+
+def _cached_read(fn):
+    """Serve fn(*args) from the read cache, keyed by (name, args, data version)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if MEMO_CACHE_TTL <= 0:
+            return fn(*args, **kwargs)
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())), _read_cache.version)
+        hit, value = _read_cache.get(key)
+        if hit:
+            return value
+        value = fn(*args, **kwargs)
+        if key[-1] == _read_cache.version:  # don't store a result that raced a write
+            _read_cache.set(key, value)
+        return value
+    return wrapper
+
+
+def cache_stats() -> dict:
+    """Read-cache hit/miss metrics (for /stats)."""
+    return _read_cache.snapshot()
+
+
+_replica = search_replica.SearchReplica(os.path.join(CACHE_DIR, "search.sqlite3")) if SEARCH_REPLICA else None
+
+
+def _replicate(saved=(), deleted=()) -> None:
+    """Mirror written/deleted rows into the local search replica (never fails the write)."""
+    if _replica is None:
+        return
+    try:
+        if saved:
+            _replica.upsert(saved)
+        if deleted:
+            _replica.delete(deleted)
+    except Exception:
+        log.exception("Search replica update failed; the next sync will catch up")
+
+
+# Each chat keeps its own collection: a URL is unique per chat (idx_memos_chat_canonical_url)
+_CONFLICT_KEY = "chat_id,canonical_url"
+
+
+def _memo_key(memo: dict) -> tuple:
+    return memo["chat_id"], memo["canonical_url"]
+
+
+class _MemoWriter:
+    """Write-behind buffer: upserts arriving within MEMO_FLUSH_MS become one multi-row upsert.
+
+    Callers block on a Future until their batch is written, so they still get
+    the saved row (with its generated id) back.
+    """
+
+    def __init__(self, window_s: float, max_batch: int):
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: list[tuple[dict, Future]] = []
+        self._timer: threading.Timer | None = None
+        self.stats = {"flushes": 0, "rows": 0, "max_batch": 0}
+
+    def submit(self, memo: dict) -> Future:
+        fut: Future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((memo, fut))
+            if len(self._pending) >= self.max_batch:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._write(batch)
+        return fut
+
+    def flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def _take(self) -> list[tuple[dict, Future]]:
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _write(self, batch: list[tuple[dict, Future]]) -> None:
+        # PostgREST bulk upserts need identical keys per row, and one statement
+        # cannot touch the same conflict key twice: group by key set, last write wins.
+        # Groups are separate statements, so each one succeeds or fails on its own.
+        groups: dict[tuple, tuple[dict[tuple, dict], list[tuple[dict, Future]]]] = {}
+        for memo, fut in batch:
+            rows, waiters = groups.setdefault(tuple(sorted(memo)), ({}, []))
+            rows[_memo_key(memo)] = memo
+            waiters.append((memo, fut))
+        saved: dict[tuple, dict] = {}
+        written = 0
+        for rows, waiters in groups.values():
+            try:
+                data = _sb.table(TABLE).upsert(list(rows.values()), on_conflict=_CONFLICT_KEY).execute().data
+            except Exception as e:
+                log.exception("Memo flush failed (%d rows)", len(waiters))
+                for _, fut in waiters:
+                    fut.set_exception(e)
+                continue
+            group_saved = {_memo_key(r): r for r in data}
+            saved.update(group_saved)
+            written += len(waiters)
+            for memo, fut in waiters:
+                row = group_saved.get(_memo_key(memo))
+                fut.set_result([row] if row else [])
+        if not written:
+            return
+        # Any committed group changed the table: update the search replica first, then
+        # invalidate, so a reader that misses after the bump never sees the old replica
+        _replicate(saved=saved.values())
+        _read_cache.bump()
+        self.stats["flushes"] += 1
+        self.stats["rows"] += written
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+
+_writer = _MemoWriter(MEMO_FLUSH_MS / 1000, MEMO_FLUSH_SIZE)
+
+
+def upsert_memo(memo: dict) -> list[dict]:
+    """Insert or update memo by (chat_id, canonical_url) (batched with concurrent saves)."""
+    memo.setdefault("canonical_url", urls.canonicalize(memo["source_url"]))
+    if MEMO_FLUSH_MS <= 0:
+        data = _sb.table(TABLE).upsert(memo, on_conflict=_CONFLICT_KEY).execute().data
+        _replicate(saved=data)
+        _read_cache.bump()
+        return data
+    return _writer.submit(memo).result()
+
+
+def flush_writes() -> None:
+    """Write out buffered memo upserts now (call on shutdown)."""
+    _writer.flush()
+
+
+def writer_stats() -> dict:
+    return dict(_writer.stats)
+
+
+def find_near_duplicate(chat_id: int, fp: int, max_distance: int = simhash.MAX_DISTANCE) -> dict | None:
+    """Chat's closest memo whose content fingerprint is within max_distance bits (LSH-banded RPC)."""
+    rows = _sb.rpc(
+        "find_near_duplicate",
+        {"chat": chat_id, "fp": simhash.to_signed(fp), "fp_bands": simhash.bands(fp), "max_distance": max_distance},
+    ).execute().data
+    return rows[0] if rows else None
 
 
-def upsert_memo(memo: dict) -> dict:
-    """Insert or update memo by source_url."""
-    return _sb.table(TABLE).upsert(memo, on_conflict="source_url").execute().data
-
-
-def list_memos(limit: int = 20, offset: int = 0) -> list[dict]:
-    return (
-        _sb.table(TABLE)
-        .select("id,title,summary_bullets,category,tags,source_url,source_type,created_at")
-        .order("created_at", desc=True)
-        .range(offset, offset + limit - 1)
-        .execute()
-        .data
-    )
-
-
-def count_memos() -> int:
-    """Return total memo count."""
-    res = _sb.table(TABLE).select("id", count="exact").execute()
-    return res.count or 0
-
-
-def search_memos_text(query: str, limit: int = 5, offset: int = 0) -> tuple[list[dict], int]:
-    """Keyword search via RPC (title, category, raw_content, tags, bullets)."""
+def _b36(n: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if not n:
+            return out
+
+
+def encode_cursor(memo: dict) -> str:
+    """Compact keyset cursor for a row: base36 epoch-micros '.' base64url UUID (~34 chars).
+
+    Short enough to fit Telegram's 64-byte callback_data next to the page number.
+    """
+    ts = datetime.fromisoformat(memo["created_at"])
+    micros = (ts - _EPOCH) // timedelta(microseconds=1)
+    uid = base64.urlsafe_b64encode(uuid.UUID(memo["id"]).bytes).rstrip(b"=").decode()
+    return f"{_b36(micros)}.{uid}"
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Inverse of encode_cursor -> (created_at ISO string, UUID string)."""
+    ts_part, _, id_part = cursor.partition(".")
+    ts = _EPOCH + timedelta(microseconds=int(ts_part, 36))
+    uid = uuid.UUID(bytes=base64.urlsafe_b64decode(id_part + "=="))
+    return ts.isoformat(), str(uid)
+
+
+@_cached_read
+def list_memos_keyset(
+    chat_id: int,
+    limit: int = 20,
+    cursor: str | None = None,
+    backward: bool = False,
+    category: str | None = None,
+) -> tuple[list[dict], bool, int | None]:
+    """One newest-first page of the chat's memos after (or, backward, before) `cursor`.
+
+    Returns (memos, more, total): `more` says whether another page exists in the
+    direction of travel; `total` comes from the chat's category_counts rows
+    (None if the page came back empty for a category).
+    """
+    params = {"chat": chat_id, "lim": limit, "backward": backward, "cat": category}
+    if cursor:
+        params["cur_ts"], params["cur_id"] = decode_cursor(cursor)
+    elif backward:
+        raise ValueError("backward paging needs a cursor")
+    rows = _sb.rpc("list_memos_keyset", params).execute().data or []
+    total = rows[0].get("total_count") if rows else None
+    for r in rows:
+        r.pop("total_count", None)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    if total is None and category is None:
+        total = count_memos(chat_id)
+    return rows, more, total
+
+
+@_cached_read
+def count_memos(chat_id: int) -> int:
+    """Return the chat's memo count (sum of its trigger-maintained category counters)."""
+    return sum(c["count"] for c in get_category_counts(chat_id))
+
+
+@_cached_read
+def search_memos_text(chat_id: int, query: str, limit: int = 5, offset: int = 0) -> tuple[list[dict], int]:
+    """Keyword search over the chat's memos (title, category, raw_content, tags, bullets).
+
+    Served from the local FTS5 replica when SEARCH_REPLICA is on and synced;
+    otherwise via the trigram-indexed RPC (relevance-ranked, total capped at 1000).
+    """
+    if _replica is not None and _replica.ready:
+        return _replica.search(chat_id, query, limit, offset)
     rows = _sb.rpc(
         "search_memos",
-        {"query": query, "lim": limit, "off": offset},
+        {"chat": chat_id, "query": query, "lim": limit, "off": offset},
     ).execute().data
     if not rows:
         return [], 0
@@ -46,115 +334,386 @@ def search_memos_text(query: str, limit: int = 5, offset: int = 0) -> tuple[list
 
 
 
-def find_by_url(url: str) -> dict | None:
-    """Check if memo with this source_url already exists."""
-    rows = _sb.table(TABLE).select("id,title").eq("source_url", url).limit(1).execute().data
+def find_by_url(chat_id: int, url: str) -> dict | None:
+    """Check if the chat already has a memo with the same canonical URL."""
+    rows = (
+        _sb.table(TABLE)
+        .select("id,title,category,source_type")
+        .eq("chat_id", chat_id)
+        .eq("canonical_url", urls.canonicalize(url))
+        .limit(1)
+        .execute()
+        .data
+    )
     return rows[0] if rows else None
 
 
-def _resolve_id(memo_id: str) -> str | None:
-    """Resolve full or partial UUID. Uses RPC for prefix match."""
-    memo_id = memo_id.strip()
-    if not memo_id:
-        return None
-    if len(memo_id) == 36:
-        return memo_id
-    # Use RPC function for prefix matching (uuid::text LIKE)
-    rows = _sb.rpc("find_memo_by_prefix", {"prefix": memo_id}).execute().data
-    return rows[0]["id"] if rows else None
+class AmbiguousIdError(ValueError):
+    """A short id prefix matches more than one memo."""
 
 
-def delete_memo(memo_id: str) -> bool:
-    resolved = _resolve_id(memo_id)
-    if not resolved:
-        return False
-    res = _sb.table(TABLE).delete().eq("id", resolved).execute()
-    return len(res.data) > 0
+_ID_PREFIX_RE = re.compile(r"^[0-9a-f-]{1,36}$")
+
+
+def _normalize_id(memo_id: str) -> str | None:
+    """Lower-cased id/prefix, or None if it cannot be part of a UUID."""
+    memo_id = memo_id.strip().lower()
+    return memo_id if _ID_PREFIX_RE.match(memo_id) else None
 
 
-def get_memo_by_id(memo_id: str) -> dict | None:
-    """Get single memo by full or partial UUID (includes raw_content)."""
-    resolved = _resolve_id(memo_id)
-    if not resolved:
+def delete_memo(chat_id: int, memo_id: str) -> bool:
+    """Delete the chat's memo by full UUID or unique prefix (one RPC). Raises AmbiguousIdError."""
+    memo_id = _normalize_id(memo_id)
+    if not memo_id:
+        return False
+    if len(memo_id) == 36:
+        rows = _sb.table(TABLE).delete().eq("id", memo_id).eq("chat_id", chat_id).execute().data
+        ids = [r["id"] for r in rows]
+    else:
+        rows = _sb.rpc("delete_memo_by_prefix", {"chat": chat_id, "prefix": memo_id}).execute().data
+        matches = rows[0]["matches"] if rows else 0
+        if matches > 1:
+            raise AmbiguousIdError(memo_id)
+        ids = [rows[0]["deleted_id"]] if matches == 1 else []
+    if ids:
+        _replicate(deleted=ids)
+        _read_cache.bump()
+    return bool(ids)
+
+
+@_cached_read
+def get_memo_by_id(chat_id: int, memo_id: str) -> dict | None:
+    """Get the chat's memo by full UUID or unique prefix (includes raw_content). Raises AmbiguousIdError."""
+    memo_id = _normalize_id(memo_id)
+    if not memo_id:
         return None
-    rows = _sb.table(TABLE).select("*").eq("id", resolved).execute().data
+    if len(memo_id) == 36:
+        rows = _sb.table(TABLE).select("*").eq("id", memo_id).eq("chat_id", chat_id).execute().data
+    else:
+        rows = _sb.rpc("find_memos_by_prefix", {"chat": chat_id, "prefix": memo_id}).execute().data
+        if len(rows) > 1:
+            raise AmbiguousIdError(memo_id)
     return rows[0] if rows else None
 
 
-def get_memos_by_category(category: str) -> list[dict]:
+@_cached_read
+def get_category_counts(chat_id: int) -> list[dict]:
+    """Get the chat's memo count per category (trigger-maintained category_counts rollup)."""
     return (
-        _sb.table(TABLE)
-        .select("id,title,summary_bullets,category,tags,source_url,source_type,created_at")
-        .ilike("category", f"%{category}%")
-        .order("created_at", desc=True)
-        .limit(20)
+        _sb.table("category_counts")
+        .select("category,count")
+        .eq("chat_id", chat_id)
+        .gt("count", 0)
+        .order("count", desc=True)
         .execute()
         .data
     )
 
 
-def get_category_counts() -> list[dict]:
-    """Get memo count per category."""
-    # Supabase doesn't support GROUP BY directly, fetch all categories and count in Python
-    rows = _sb.table(TABLE).select("category").execute().data
-    counts: dict[str, int] = {}
-    for r in rows:
-        cat = r.get("category", "기타")
-        counts[cat] = counts.get(cat, 0) + 1
-    return [{"category": k, "count": v} for k, v in sorted(counts.items(), key=lambda x: -x[1])]
+def get_one_random_memo(chat_id: int) -> dict | None:
+    """채팅의 메모 중 랜덤 1개 반환 (random-key 인덱스 샘플링 RPC)."""
+    rows = _sb.rpc("random_memos", {"chat": chat_id, "n": 1}).execute().data
+    return rows[0] if rows else None
 
 
-def get_one_random_memo() -> dict | None:
-    """전체 메모 중 랜덤 1개 반환."""
-    import random
-    rows = (
-        _sb.table(TABLE)
-        .select("id,title,summary_bullets,category,tags")
-        .order("created_at", desc=True)
-        .limit(200)
-        .execute()
-        .data
-    )
-    return random.choice(rows) if rows else None
+def get_random_memos_by_category(chat_id: int, per_category: int = 1, max_categories: int = 3) -> list[dict]:
+    """카테고리별 랜덤 per_category개씩, max_categories개 카테고리만 반환 (서버 측 층화 샘플링)."""
+    return _sb.rpc(
+        "random_memos_by_category",
+        {"chat": chat_id, "per_category": per_category, "max_categories": max_categories},
+    ).execute().data or []
 
 
-def get_random_memos_by_category(per_category: int = 1, max_categories: int = 3) -> list[dict]:
-    """카테고리별 랜덤 per_category개씩, max_categories개 카테고리만 반환."""
-    import random
-    from collections import defaultdict
+# ── Semantic search (pgvector) ───────────────────────────────
+SEMANTIC_TOP_K = 20
+
+
+@_cached_read
+def _semantic_top(chat_id: int, query: str) -> list[dict]:
+    embedded = embeddings.embed_query(query)
+    if embedded is None:
+        return []
+    vec, model = embedded
+    return _sb.rpc(
+        "match_memos",
+        {"chat": chat_id, "query_embedding": vec, "model": model, "match_count": SEMANTIC_TOP_K},
+    ).execute().data or []
 
-    rows = (
-        _sb.table(TABLE)
-        .select("id,title,summary_bullets,category,tags")
-        .order("created_at", desc=True)
-        .limit(200)
-        .execute()
-        .data
-    )
-    by_cat: dict[str, list] = defaultdict(list)
-    for m in rows:
-        by_cat[m.get("category") or "기타"].append(m)
 
-    cats = list(by_cat.keys())
-    random.shuffle(cats)
+def search_memos_semantic(chat_id: int, query: str, limit: int = 5, offset: int = 0) -> tuple[list[dict], int]:
+    """The chat's nearest memos to the query embedding (HNSW); total is at most SEMANTIC_TOP_K."""
+    top = _semantic_top(chat_id, query)
+    return top[offset:offset + limit], len(top)
 
-    selected = []
-    for cat in cats[:max_categories]:
-        pool = by_cat[cat]
-        selected.extend(random.sample(pool, min(per_category, len(pool))))
-    return selected
+
+@_cached_read
+def similar_memos(chat_id: int, memo_id: str, limit: int = 5) -> tuple[dict | None, list[dict]]:
+    """(memo, its nearest neighbours in the chat) for a full id or unique prefix. Raises AmbiguousIdError."""
+    memo = get_memo_by_id(chat_id, memo_id)
+    if memo is None:
+        return None, []
+    memo.pop("embedding", None)
+    rows = _sb.rpc(
+        "similar_memos", {"chat": chat_id, "memo_id": memo["id"], "match_count": limit},
+    ).execute().data
+    return memo, rows or []
+
+
+def select_memos_for_embedding(model: str, after_id: str | None = None, limit: int = 100) -> list[dict]:
+    """Memos without a vector from `model`, in id order (embedding backfill)."""
+    q = (
+        _sb.table(TABLE)
+        .select("id,title,summary_bullets,tags,raw_content")
+        .or_(f'embedding_model.is.null,embedding_model.neq."{model}"')
+    )
+    if after_id:
+        q = q.gt("id", after_id)
+    return q.order("id").limit(limit).execute().data
+
+
+def set_memo_embeddings(rows: list[dict], model: str) -> int:
+    """Bulk-write [{"id", "embedding"}] in one RPC. Returns rows updated."""
+    n = _sb.rpc("set_memo_embeddings", {"rows": rows, "model": model}).execute().data
+    _read_cache.bump()
+    return n or 0
+
+
+# ── Search replica sync ──────────────────────────────────────
+_REPLICA_COLUMNS = "id,chat_id,title,summary_bullets,category,tags,source_url,source_type,raw_content,created_at"
+
+
+def sync_search_replica(full: bool = False, page: int = 1000) -> int:
+    """Copy memos created since the replica's watermark (everything if full). Returns rows copied.
+
+    Saves and deletes made by this process reach the replica immediately;
+    this catches rows written elsewhere (import / backfill CLIs). Deletes made
+    by other processes only disappear on a --rebuild.
+    """
+    if _replica is None:
+        raise RuntimeError("SEARCH_REPLICA is off")
+    if full:
+        _replica.clear()
+    watermark = _replica.watermark()
+    copied = 0
+    newest = watermark
+    while True:
+        q = _sb.table(TABLE).select(_REPLICA_COLUMNS)
+        if watermark:
+            q = q.gte("created_at", watermark)
+        rows = q.order("created_at").order("id").range(copied, copied + page - 1).execute().data
+        if not rows:
+            break
+        _replica.upsert(rows)
+        copied += len(rows)
+        newest = rows[-1]["created_at"]
+        if len(rows) < page:
+            break
+    # An empty table still counts as synced (searches go local from now on)
+    _replica.set_watermark(newest or "1970-01-01T00:00:00+00:00")
+    if copied:
+        _read_cache.bump()
+    return copied
+
+
+def replica_stats() -> dict | None:
+    return _replica.info() if _replica is not None else None
+
+
+# ── Backfill ─────────────────────────────────────────────────
+def select_memos_for_backfill(
+    category: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    source_type: str | None = None,
+    after_id: str | None = None,
+    limit: int = 500,
+) -> list[dict]:
+    """Page through memos in id order (stable cursor even while rows are rewritten)."""
+    q = _sb.table(TABLE).select("id,source_url,source_type,raw_content")
+    if category:
+        q = q.eq("category", category)
+    if since:
+        q = q.gte("created_at", since)
+    if until:
+        q = q.lt("created_at", until)
+    if source_type:
+        q = q.eq("source_type", source_type)
+    if after_id:
+        q = q.gt("id", after_id)
+    return q.order("id").limit(limit).execute().data
+
+
+def update_memo_analyses(rows: list[dict], chunk: int = 500) -> int:
+    """Write re-analysis results onto existing memos (UPDATE only: deleted memos stay deleted).
+
+    Rows carry id, title, summary_bullets, category, tags. The RPC clears the now
+    stale embedding and the rows are re-embedded here; any that fail are picked
+    up by `python -m app.embeddings --backfill`.
+    """
+    written = 0
+    for i in range(0, len(rows), chunk):
+        data = _sb.rpc("update_memo_analyses", {"rows": rows[i:i + chunk]}).execute().data or []
+        _replicate(saved=data)
+        _reembed(data)
+        written += len(data)
+    _read_cache.bump()
+    return written
+
+
+def _reembed(rows: list[dict], chunk: int = 100) -> None:
+    embedder = embeddings.get_embedder()
+    if embedder is None:
+        return
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        try:
+            vectors = embedder.embed([embeddings.memo_text(r) for r in part])
+            set_memo_embeddings([{"id": r["id"], "embedding": v} for r, v in zip(part, vectors)], embedder.model)
+        except Exception:
+            log.exception("Re-embedding %d memos failed (embedding backfill will fill them)", len(part))
+
+
+def recanonicalize_urls(canonicalize, page: int = 1000) -> tuple[int, int]:
+    """Recompute canonical_url for every memo (after rule changes). Returns (updated, collisions).
+
+    Rows whose new key is already taken by an older memo of the same chat keep
+    their current key and are logged, so the unique index never blocks the run.
+    """
+    rows: list[dict] = []
+    while True:
+        chunk = (
+            _sb.table(TABLE)
+            .select("id,chat_id,source_url,canonical_url")
+            .order("created_at")
+            .order("id")
+            .range(len(rows), len(rows) + page - 1)
+            .execute()
+            .data
+        )
+        rows.extend(chunk)
+        if len(chunk) < page:
+            break
+
+    # Decide every key first: the oldest memo keeps a contested key
+    claimed = {(r["chat_id"], r["canonical_url"]) for r in rows}
+    owner: dict[tuple, str] = {}
+    changes = []
+    collisions = 0
+    for r in rows:
+        url = canonicalize(r["source_url"])
+        key = (r["chat_id"], url)
+        if url == r["canonical_url"]:
+            owner.setdefault(key, r["id"])
+            continue
+        if key in owner or key in claimed:
+            collisions += 1
+            log.warning("canonical_url collision: %s (%s) duplicates %s", r["id"], r["source_url"], url)
+            continue
+        owner[key] = r["id"]
+        changes.append({"id": r["id"], "canonical_url": url})
+
+    for c in changes:
+        _sb.table(TABLE).update({"canonical_url": c["canonical_url"]}).eq("id", c["id"]).execute()
+    if changes:
+        _read_cache.bump()
+    return len(changes), collisions
 
 
 # ── Users ────────────────────────────────────────────────────
 USERS_TABLE = "users"
 
 
-def upsert_user(chat_id: int, username: str | None = None) -> None:
-    row = {"chat_id": chat_id}
+# In-process registry of known chats: only new/changed users are written, in batches.
+_known_users: dict[int, str | None] = {}
+_dirty_users: dict[int, str | None] = {}
+_inactive_users: set[int] = set()  # blocked the bot; reactivated on their next message
+_users_lock = threading.Lock()
+
+
+def _user_row(chat_id: int, username: str | None) -> dict:
+    row = {"chat_id": chat_id, "active": True}
     if username:
         row["username"] = username
-    _sb.table(USERS_TABLE).upsert(row, on_conflict="chat_id").execute()
+    return row
+
+
+def _select_users(columns: str, active_only: bool = False, page: int = 1000) -> list[dict]:
+    """Every users row, paged by chat_id (PostgREST caps a single select at 1000 rows)."""
+    rows: list[dict] = []
+    while True:
+        q = _sb.table(USERS_TABLE).select(columns)
+        if active_only:
+            q = q.eq("active", True)
+        chunk = q.order("chat_id").range(len(rows), len(rows) + page - 1).execute().data
+        rows.extend(chunk)
+        if len(chunk) < page:
+            return rows
+
+
+def load_user_registry() -> int:
+    """Seed the registry from the users table (call once at startup)."""
+    rows = _select_users("chat_id,username,active")
+    with _users_lock:
+        for r in rows:
+            _known_users[r["chat_id"]] = r.get("username")
+            if r.get("active") is False:
+                _inactive_users.add(r["chat_id"])
+    return len(rows)
+
+
+def remember_user(chat_id: int, username: str | None = None) -> bool:
+    """Note a user seen in an update. Returns True if a write was queued (new or renamed)."""
+    with _users_lock:
+        if chat_id in _inactive_users:
+            _inactive_users.discard(chat_id)  # messaging us again means the block was lifted
+        elif chat_id in _known_users and (not username or _known_users[chat_id] == username):
+            return False
+        _known_users[chat_id] = username or _known_users.get(chat_id)
+        _dirty_users[chat_id] = _known_users[chat_id]
+        return True
+
+
+def flush_users() -> int:
+    """Upsert queued user changes in one request per key shape. Returns rows written."""
+    with _users_lock:
+        dirty = dict(_dirty_users)
+        _dirty_users.clear()
+    if not dirty:
+        return 0
+    named = [_user_row(c, u) for c, u in dirty.items() if u]
+    unnamed = [_user_row(c, u) for c, u in dirty.items() if not u]
+    try:
+        for rows in (named, unnamed):
+            if rows:
+                _sb.table(USERS_TABLE).upsert(rows, on_conflict="chat_id").execute()
+    except Exception:
+        with _users_lock:
+            for c, u in dirty.items():
+                _dirty_users.setdefault(c, u)
+        raise
+    return len(dirty)
 
 
 def list_users() -> list[dict]:
-    return _sb.table(USERS_TABLE).select("chat_id").execute().data
+    """Chats that still receive scheduled pushes."""
+    return _select_users("chat_id", active_only=True)
+
+
+def deactivate_users(chat_ids: list[int]) -> None:
+    """Skip chats that blocked the bot (or no longer exist) in future pushes."""
+    if not chat_ids:
+        return
+    _sb.table(USERS_TABLE).update({"active": False}).in_("chat_id", list(chat_ids)).execute()
+    with _users_lock:
+        _inactive_users.update(chat_ids)
+
+
+def _flush_all() -> None:
+    _writer.flush()
+    try:
+        flush_users()
+    except Exception:
+        log.exception("User flush at exit failed")
+
+
+atexit.register(_flush_all)
@@ -0,0 +1,39 @@
+"""Hangul-aware tokenizer shared by search, SimHash and hash embeddings (stdlib only).
+
+Hangul has no spaces inside compounds ("에이전트설계"), so whole-word tokens
+only match whole eojeol. Hangul runs become overlapping character bigrams
+instead; other words stay whole, lower-cased.
+"""
+from __future__ import annotations
+
+import re
+
+_HANGUL = "가-힣ㄱ-ㅎㅏ-ㅣ"
+_TOKEN_RE = re.compile(rf"[{_HANGUL}]+|[^\W_{_HANGUL}]+")
+_HANGUL_RE = re.compile(rf"[{_HANGUL}]")
+
+
+def words(text: str) -> list[str]:
+    """Lower-cased Hangul runs and other words, in order."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def is_hangul(word: str) -> bool:
+    return bool(_HANGUL_RE.match(word))
+
+
+def hangul_grams(run: str) -> list[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def grams(text: str) -> str:
+    """Index form of text: Hangul bigrams + lower-cased words, space separated."""
+    out: list[str] = []
+    for tok in words(text):
+        if is_hangul(tok):
+            out.extend(hangul_grams(tok))
+        else:
+            out.append(tok)
+    return " ".join(out)
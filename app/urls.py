@@ -0,0 +1,126 @@
+"""URL canonicalization for dedup.
+
+Two levels:
+  clean_url     — safe to fetch and store: drops tracking parameters and the
+                  fragment, nothing else.
+  canonicalize  — dedup key (memos.canonical_url): additionally lower-cases,
+                  forces https, strips www./m./amp. hosts, trailing slashes and
+                  AMP paths, sorts the query and applies per-domain rules
+                  (x.com status ids, youtu.be, Naver blog, ...). Not meant for fetching.
+
+Existing rows can be re-keyed after rule changes with:
+
+    python -m app.urls --backfill
+"""
+from __future__ import annotations
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+URL_RE = re.compile(r"https?://\S+")
+
+# Query parameters that never change the content
+_TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "igsh", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "ref_src", "ref_url", "spm", "share_source", "from_share",
+}
+_TRACKING_PREFIXES = ("utm_", "pk_", "ga_")
+_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+_X_HOSTS = {"twitter.com", "x.com", "fxtwitter.com", "vxtwitter.com", "fixupx.com"}
+_X_STATUS_RE = re.compile(r"^/(?:[^/]+|i(?:/web)?)/status(?:es)?/(\d+)")
+_YT_SHORT_RE = re.compile(r"^/(?:shorts|live|embed)/([\w-]{6,})")
+_NAVER_BLOG_RE = re.compile(r"^/([\w-]+)/(\d+)$")
+_AMP_PATH_RE = re.compile(r"(?:/amp)+/?$|\.amp(?=\.html?$|$)")
+
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in _TRACKING_PARAMS or key.startswith(_TRACKING_PREFIXES)
+
+
+def clean_url(url: str) -> str:
+    """Drop tracking parameters and the fragment; everything else is kept byte for byte."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        return url
+    # Filter the raw "k=v" pieces: re-encoding would turn %20 into + or ?foo into ?foo=
+    query = "&".join(p for p in parts.query.split("&") if p and not _is_tracking(p.partition("=")[0]))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def _strip_host(host: str) -> str:
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            return host[len(prefix):]
+    return host
+
+
+def canonicalize(url: str) -> str:
+    """Dedup key for a URL. Non-http(s) URLs (memo://...) are returned unchanged."""
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        return url
+    host = _strip_host(parts.hostname.lower().rstrip("."))
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+
+    # ── Per-domain rules ──
+    if host in _X_HOSTS:
+        host = "x.com"
+        m = _X_STATUS_RE.match(path)
+        if m:
+            path = f"/i/status/{m.group(1)}"
+        query = []  # ?s=20&t=... share noise; status ids are in the path
+    elif host in ("youtube.com", "youtu.be", "youtube-nocookie.com", "music.youtube.com"):
+        video = None
+        if host == "youtu.be":
+            video = path.strip("/").split("/")[0] or None
+        elif _YT_SHORT_RE.match(path):
+            video = _YT_SHORT_RE.match(path).group(1)
+        elif path == "/watch":
+            video = dict(query).get("v")
+        if video:
+            host, path, query = "youtube.com", "/watch", [("v", video)]
+        else:
+            query = [(k, v) for k, v in query if k in ("list", "v")]
+        host = "youtube.com"
+    elif host == "instagram.com":
+        query = []  # ?img_index=, ?hl= ... never identify the post
+    elif host == "blog.naver.com":
+        params = dict(query)
+        if path.lower() in ("/postview.naver", "/postview.nhn") and "blogId" in params and "logNo" in params:
+            path, query = f"/{params['blogId']}/{params['logNo']}", []
+        elif _NAVER_BLOG_RE.match(path):
+            query = []
+
+    # ── Generic rules ──
+    path = _AMP_PATH_RE.sub("", path)
+    query = [(k, v) for k, v in query if not (k.lower() in ("amp", "outputtype") and v.lower() in ("", "1", "amp"))]
+    if len(path) > 1:
+        path = path.rstrip("/")
+    netloc = host
+    if parts.port and parts.port not in (80, 443):
+        netloc = f"{host}:{parts.port}"
+    return urlunsplit(("https", netloc, path or "/", urlencode(sorted(query)), ""))
+
+
+def main() -> None:
+    import argparse
+    import logging
+
+    from . import supabase_client
+
+    ap = argparse.ArgumentParser(prog="python -m app.urls", description="Recompute memos.canonical_url.")
+    ap.add_argument("--backfill", action="store_true", help="re-key every memo with the current rules")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not args.backfill:
+        ap.print_help()
+        return
+    updated, collisions = supabase_client.recanonicalize_urls(canonicalize)
+    logging.getLogger(__name__).info("canonical_url backfill: %d updated, %d collisions kept as-is", updated, collisions)
+
+
+if __name__ == "__main__":
+    main()
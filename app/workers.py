@@ -1,15 +1,20 @@
 """Pipeline workers: Analyst, Librarian, Recommender."""
 from __future__ import annotations
 
+import asyncio
 import base64
 import json
 import re
 from datetime import datetime, timezone
 
-from . import claude_client, supabase_client, extractor
+from . import claude_client, embeddings, simhash, supabase_client, extractor, urls
+from .router import split_url
 from .schemas import ANALYST_SCHEMA, ANALYST_IMAGE_SCHEMA, RECOMMENDER_SCHEMA
 
 PAGE_SIZE = 5
+CATEGORY_PAGE_SIZE = 20
+_PAGE_RE = re.compile(r"^(\d+):([np][\w.-]+)$")
+_CATEGORY_PAGE_RE = re.compile(r"^(\d+):([np][\w.-]+):(.+)$", re.S)
 
 
 def _ensure_list(val) -> list:
@@ -91,47 +96,88 @@ def _decorate(m: dict) -> dict:
 
 
 # ── Analyst (🔍) ────────────────────────────────────────────
-def analyst_run(payload: str) -> dict:
-    """Extract URL (with optional user context) -> call Claude -> return analysis JSON."""
-    url_match = re.search(r"https?://\S+", payload)
-    url = url_match.group(0) if url_match else ""
-    # Detect bare domain (e.g. griddyicons.com) and prepend https://
-    if not url:
-        domain_match = re.search(r"\b([\w-]+\.(?:com|net|org|io|co|dev|ai|kr|me|app|xyz))\b", payload, re.I)
-        if domain_match:
-            url = f"https://{domain_match.group(1)}"
-    user_context = payload.replace(url_match.group(0) if url_match else "", "").strip() if url else payload
-
-    source_type, extracted = extractor.extract_text(url) if url else ("web", "")
-
+# System prompts are module constants so the prefix is byte-identical across calls
+# (prompt caching); anything per-call belongs in the user message.
+ANALYST_SYSTEM = (
+    "You are a concise analyst. Given text (possibly with user notes and webpage content), "
+    "produce a memo with: title (Korean), 3 bullet summary (Korean), category, tags."
+    "[출력 규칙]"
+    "title: 10~25자, 핵심 포함"
+    "summary_bullets: 1~3개, 각 15~35자, 커뮤니티 말투(예: “~하면 됨”, “~인 듯”, “요약하면”), 쉬운 말 + 군더더기 제거"
+    "category: [일, 배움, 아이디어, 정보, 기록, 문화, 소비] 중 1개"
+    "tags: 2~5개 명사형(2~10자), 검색이 쉽도록 키워드를 추출하고, 식당/카페 관련 메모는 무조건 맛집 태그를 추가. 장소가 있으면 장소(2~5자) 키워드를 반드시 추가."
+)
+
+ANALYST_IMAGE_SYSTEM = (
+    "You are a precise analyst. Given an image (screenshot, note, document, photo with text, etc.) "
+    "and optional user notes, do TWO things:\n"
+    "1) raw_text: Extract ALL visible text from the image verbatim. "
+    "Preserve the original structure faithfully — headings, bullet points, numbered lists, table rows, "
+    "paragraphs, labels, captions, metadata. Do NOT summarize, paraphrase, or omit any text. "
+    "If the image has no readable text, describe the visual content in Korean.\n"
+    "2) Produce a memo: title (Korean), 3 bullet summary (Korean), category, tags.\n"
+    "[메모 출력 규칙]\n"
+    "title: 10~25자, 핵심 포함\n"
+    "summary_bullets: 정확히 3개, 각 15~35자, 커뮤니티 말투(예: '~하면 됨', '~인 듯', '요약하면'), 쉬운 말 + 군더더기 제거\n"
+    "category: [일, 배움, 아이디어, 정보, 기록, 문화, 소비] 중 1개\n"
+    "tags: 2~5개 명사형(2~10자), 식당/카페는 맛집 태그 필수, 장소가 있으면 장소 키워드 추가."
+)
+
+
+def analyst_input(user_context: str, extracted: str) -> str:
+    """User message for ANALYST_SYSTEM (also used by the batch backfill)."""
     parts = []
     if user_context:
         parts.append(f"사용자 메모: {user_context}")
     if extracted:
         parts.append(f"페이지 내용: {extracted}")
-    text = "\n\n".join(parts) or payload
-
-    result = claude_client.ask_json(
-        system=(
-            "You are a concise analyst. Given text (possibly with user notes and webpage content), "
-            "produce a memo with: title (Korean), 3 bullet summary (Korean), category, tags."
-            "[출력 규칙]"
-            "title: 10~25자, 핵심 포함"
-            "summary_bullets: 1~3개, 각 15~35자, 커뮤니티 말투(예: “~하면 됨”, “~인 듯”, “요약하면”), 쉬운 말 + 군더더기 제거"
-            "category: [일, 배움, 아이디어, 정보, 기록, 문화, 소비] 중 1개"
-            "tags: 2~5개 명사형(2~10자), 검색이 쉽도록 키워드를 추출하고, 식당/카페 관련 메모는 무조건 맛집 태그를 추가. 장소가 있으면 장소(2~5자) 키워드를 반드시 추가."
-        ),
+    return "\n\n".join(parts)
+
+
+async def analyst_extract(payload: str) -> dict:
+    """First analyst step: fetch the URL (if any) and build the Claude input, no API call.
+
+    Also fingerprints the content so near-duplicates can be caught before analysis.
+    """
+    url, user_context = split_url(payload)
+
+    source_type, extracted = await extractor.extract_text(url) if url else ("web", "")
+
+    # Fingerprint the page itself (not the user's note) so the same article matches
+    # whether it arrives as a URL, a mirror / AMP link or pasted text
+    fp = simhash.simhash(extracted or user_context)
+    return {
+        "url": url,
+        "user_context": user_context,
+        "source_type": source_type,
+        "text": analyst_input(user_context, extracted) or payload,
+        "simhash": fp,
+    }
+
+
+async def analyst_analyze(prepared: dict) -> dict:
+    """Second analyst step: call Claude on analyst_extract() output -> analysis JSON."""
+    text = prepared["text"]
+    result = await claude_client.ask_json(
+        system=ANALYST_SYSTEM,
         user=text,
         schema=ANALYST_SCHEMA,
+        cache=True,
     )
-    result["source_url"] = url or ""
-    result["source_type"] = source_type
+    result["source_url"] = prepared["url"] or ""
+    result["source_type"] = prepared["source_type"]
     # URL만 들어온 경우(사용자 컨텍스트 없음) raw text 저장 안 함
-    result["_raw_content"] = "" if not user_context else text
+    result["_raw_content"] = "" if not prepared["user_context"] else text
+    result["_simhash"] = prepared["simhash"]
     return result
 
 
-def analyst_run_with_image(image_bytes: bytes, caption: str = "") -> dict:
+async def analyst_run(payload: str) -> dict:
+    """Extract URL (with optional user context) -> call Claude -> return analysis JSON."""
+    return await analyst_analyze(await analyst_extract(payload))
+
+
+async def analyst_run_with_image(image_bytes: bytes, caption: str = "") -> dict:
     """Encode image as base64 -> call Claude vision -> return analysis JSON."""
     image_b64 = base64.b64encode(image_bytes).decode("utf-8")
 
@@ -141,21 +187,8 @@ def analyst_run_with_image(image_bytes: bytes, caption: str = "") -> dict:
     user_text_parts.append("이미지에서 텍스트나 핵심 내용을 추출하고 분석해주세요.")
     user_text = "\n".join(user_text_parts)
 
-    result = claude_client.ask_json_with_image(
-        system=(
-            "You are a precise analyst. Given an image (screenshot, note, document, photo with text, etc.) "
-            "and optional user notes, do TWO things:\n"
-            "1) raw_text: Extract ALL visible text from the image verbatim. "
-            "Preserve the original structure faithfully — headings, bullet points, numbered lists, table rows, "
-            "paragraphs, labels, captions, metadata. Do NOT summarize, paraphrase, or omit any text. "
-            "If the image has no readable text, describe the visual content in Korean.\n"
-            "2) Produce a memo: title (Korean), 3 bullet summary (Korean), category, tags.\n"
-            "[메모 출력 규칙]\n"
-            "title: 10~25자, 핵심 포함\n"
-            "summary_bullets: 정확히 3개, 각 15~35자, 커뮤니티 말투(예: '~하면 됨', '~인 듯', '요약하면'), 쉬운 말 + 군더더기 제거\n"
-            "category: [일, 배움, 아이디어, 정보, 기록, 문화, 소비] 중 1개\n"
-            "tags: 2~5개 명사형(2~10자), 식당/카페는 맛집 태그 필수, 장소가 있으면 장소 키워드 추가."
-        ),
+    result = await claude_client.ask_json_with_image(
+        system=ANALYST_IMAGE_SYSTEM,
         image_b64=image_b64,
         media_type="image/jpeg",
         user_text=user_text,
@@ -171,8 +204,53 @@ def analyst_run_with_image(image_bytes: bytes, caption: str = "") -> dict:
 
 
 # ── Librarian (📚) ──────────────────────────────────────────
-def librarian_run(action_payload: str, analyst_result: dict | None = None) -> dict:
-    """Handle save/list/search/delete."""
+def _find_duplicate(chat_id: int, src_url: str) -> dict | None:
+    """Return a 'duplicate' result if the chat already stored src_url."""
+    if not src_url or src_url.startswith("memo://"):
+        return None
+    existing = supabase_client.find_by_url(chat_id, src_url)
+    if not existing:
+        return None
+    return {
+        "action": "duplicate",
+        "existing_id": existing["id"],
+        "existing_title": existing["title"],
+        "existing_category": existing.get("category", ""),
+        "source_type": existing.get("source_type", ""),
+        "source_url": src_url,
+    }
+
+
+def _keyset_page(
+    chat_id: int, page: int, token: str | None, page_size: int, category: str | None = None,
+) -> dict:
+    """Fetch one keyset page. token = 'n'|'p' + cursor (older / newer than that row)."""
+    backward = bool(token) and token[0] == "p"
+    cursor = token[1:] if token else None
+    memos, more, total = supabase_client.list_memos_keyset(
+        chat_id, limit=page_size, cursor=cursor, backward=backward, category=category,
+    )
+    if backward:
+        has_prev, has_next = more, True
+        # Page numbers drift if memos were added meanwhile; pin them to what exists
+        page = max(page, 1) if more else 0
+    else:
+        has_prev, has_next = page > 0, more
+    return {
+        "memos": memos,
+        "page": page,
+        "total": total,
+        "page_size": page_size,
+        "prev_cursor": supabase_client.encode_cursor(memos[0]) if memos and has_prev else None,
+        "next_cursor": supabase_client.encode_cursor(memos[-1]) if memos and has_next else None,
+    }
+
+
+def librarian_run(chat_id: int, action_payload: str, analyst_result: dict | None = None) -> dict:
+    """Handle save/list/search/delete within the chat's own memos.
+
+    Synchronous (blocking Supabase I/O); async callers run it via asyncio.to_thread.
+    """
     action, _, payload = action_payload.partition(":")
 
     if action == "save" or analyst_result is not None:
@@ -181,40 +259,59 @@ def librarian_run(action_payload: str, analyst_result: dict | None = None) -> di
 
         src_url = analyst_result["source_url"]
 
-        # ── Dedup check ──
-        if src_url and not src_url.startswith("memo://"):
-            existing = supabase_client.find_by_url(src_url)
-            if existing:
-                return {
-                    "action": "duplicate",
-                    "existing_id": existing["id"],
-                    "existing_title": existing["title"],
-                }
+        # ── Dedup check (again: a concurrent save may have landed since "dedup:") ──
+        duplicate = _find_duplicate(chat_id, src_url)
+        if duplicate:
+            return duplicate
 
         if not src_url:
             src_url = f"memo://{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')}"
 
         memo = {
+            "chat_id": chat_id,
             "title": analyst_result["title"],
             "summary_bullets": _ensure_list(analyst_result["bullets"]),
             "category": analyst_result["category"],
             "tags": _ensure_list(analyst_result["tags"]),
             "source_url": src_url,
+            "canonical_url": urls.canonicalize(src_url),
             "source_type": analyst_result["source_type"],
             "raw_content": analyst_result.get("_raw_content", "")[:8000],
             "created_at": datetime.now(timezone.utc).isoformat(),
         }
+        fp = analyst_result.get("_simhash")
+        if fp is not None:
+            memo["simhash"] = simhash.to_signed(fp)
+            memo["simhash_bands"] = simhash.bands(fp)
+        memo.update(embeddings.embed_memo(memo))
         saved = supabase_client.upsert_memo(memo)
         return {"action": "saved", "memo": saved[0] if saved else memo}
 
+    if action == "dedup":
+        # Cheap pre-check before the analyst fetches the page and calls Claude
+        return _find_duplicate(chat_id, payload) or {"action": "new", "source_url": payload}
+
+    if action == "neardup":
+        # "neardup:{simhash}": same content under another URL / pasted, checked before Claude
+        existing = supabase_client.find_near_duplicate(chat_id, int(payload)) if payload.strip().isdigit() else None
+        if not existing:
+            return {"action": "new"}
+        return {
+            "action": "duplicate",
+            "near": True,
+            "distance": existing.get("distance"),
+            "existing_id": existing["id"],
+            "existing_title": existing["title"],
+            "existing_category": existing.get("category", ""),
+            "source_type": existing.get("source_type", ""),
+            "source_url": existing.get("source_url", ""),
+        }
+
     if action == "list":
-        page = 0
-        if payload.strip().isdigit():
-            page = int(payload.strip())
-        offset = page * PAGE_SIZE
-        memos = supabase_client.list_memos(limit=PAGE_SIZE, offset=offset)
-        total = supabase_client.count_memos()
-        return {"action": "list", "memos": memos, "page": page, "total": total}
+        # "" (first page) or "{page}:{n|p}{cursor}" from the page keyboard
+        m = _PAGE_RE.match(payload.strip())
+        page, token = (int(m.group(1)), m.group(2)) if m else (0, None)
+        return {"action": "list", **_keyset_page(chat_id, page, token, PAGE_SIZE)}
 
     if action == "search":
         # Parse page from payload: "query:page" or just "query"
@@ -227,7 +324,13 @@ def librarian_run(action_payload: str, analyst_result: dict | None = None) -> di
                 page = int(parts[-1].strip())
 
         offset = page * PAGE_SIZE
-        memos, total = supabase_client.search_memos_text(query, limit=PAGE_SIZE, offset=offset)
+        if query.startswith("~"):
+            # "/search ~질문" -> semantic (embedding) search
+            memos, total = supabase_client.search_memos_semantic(
+                chat_id, query[1:].strip(), limit=PAGE_SIZE, offset=offset,
+            )
+        else:
+            memos, total = supabase_client.search_memos_text(chat_id, query, limit=PAGE_SIZE, offset=offset)
         memos = [_decorate(m) for m in memos]
 
         return {"action": "search", "query": query, "memos": memos, "page": page, "total": total}
@@ -235,51 +338,104 @@ def librarian_run(action_payload: str, analyst_result: dict | None = None) -> di
     if action == "category":
         if not payload:
             # No category specified -> show counts per category
-            counts = supabase_client.get_category_counts()
+            counts = supabase_client.get_category_counts(chat_id)
             return {"action": "category_list", "counts": counts}
-        memos = supabase_client.get_memos_by_category(payload)
-        return {"action": "category", "category": payload, "memos": memos}
+        # "{category}" (first page) or "{page}:{n|p}{cursor}:{category}" from the page keyboard
+        m = _CATEGORY_PAGE_RE.match(payload)
+        page, token, category = (int(m.group(1)), m.group(2), m.group(3)) if m else (0, None, payload)
+        return {
+            "action": "category",
+            "category": category,
+            **_keyset_page(chat_id, page, token, CATEGORY_PAGE_SIZE, category),
+        }
 
     if action == "view":
-        memo = supabase_client.get_memo_by_id(payload)
+        try:
+            memo = supabase_client.get_memo_by_id(chat_id, payload)
+        except supabase_client.AmbiguousIdError:
+            return {"action": "view", "memo": None, "ambiguous": True}
         return {"action": "view", "memo": memo}
 
+    if action == "similar":
+        try:
+            memo, memos = supabase_client.similar_memos(chat_id, payload.strip())
+        except supabase_client.AmbiguousIdError:
+            return {"action": "similar", "memo_id": payload, "memo": None, "memos": [], "ambiguous": True}
+        return {"action": "similar", "memo_id": payload, "memo": memo, "memos": memos}
+
     if action == "delete":
-        ok = supabase_client.delete_memo(payload)
+        try:
+            ok = supabase_client.delete_memo(chat_id, payload)
+        except supabase_client.AmbiguousIdError:
+            return {"action": "delete", "memo_id": payload, "success": False, "ambiguous": True}
         return {"action": "delete", "memo_id": payload, "success": ok}
 
     return {"error": f"Unknown librarian action: {action}"}
 
 
 # ── Recommender (💡) ────────────────────────────────────────
-def recommender_run(payload: str, max_categories: int = 3, memos: list | None = None) -> dict:
-    """Recommend memos grouped by category. Only when explicitly requested."""
-    metas = memos if memos is not None else supabase_client.get_random_memos_by_category(per_category=1, max_categories=max_categories)
+RECOMMENDER_SYSTEM = (
+    "너는 '메모 추천 큐레이터'야.\n"
+    "입력은 {max_categories, memos} JSON이고, memos의 각 메모는 id/title/summary_bullets/category/tags를 가진다.\n\n"
+    "목표: 각 메모에 대해 카테고리별 추천 결과(JSON)를 반환.\n\n"
+    "규칙:\n"
+    "1) memo.category를 기준으로 묶어.\n"
+    "   - category가 너무 넓으면 tags를 참고해 더 직관적인 이름으로 바꿔도 됨.\n"
+    "2) 카테고리는 최대 max_categories개.\n"
+    "3) 각 카테고리에는 emoji 1개, one_liner(커뮤니티 말투로 자극적인 한 줄 소개) 1개.\n"
+    "4) 각 카테고리 items는 입력된 메모 전부 포함.\n"
+    "5) 각 item에는:\n"
+    "   - memo_id: 입력의 id 그대로\n"
+    "   - title: 입력의 title 그대로\n"
+    "   - preview: summary_bullets 중 가장 '아 이거!' 싶은 1개\n"
+    "   - reason: 짧고 직관적으로 왜 지금 봐야 하는지\n"
+    "   - tags: 입력 tags 중 핵심 2~4개만\n"
+    "6) 말투: 친근 + 살짝 자극(커뮤니티 톤). 정보는 정확하게.\n"
+)
+
+
+async def recommender_run(
+    chat_id: int,
+    payload: str,
+    max_categories: int = 3,
+    memos: list | None = None,
+    priority: int = claude_client.PRIORITY_INTERACTIVE,
+) -> dict:
+    """Recommend the chat's memos grouped by category. Only when explicitly requested."""
+    if memos is not None:
+        metas = memos
+    else:
+        metas = await asyncio.to_thread(
+            supabase_client.get_random_memos_by_category, chat_id, per_category=1, max_categories=max_categories,
+        )
     if not metas:
         return {"categories": []}
 
-    result = claude_client.ask_json(
-        system=(
-            "너는 '메모 추천 큐레이터'야.\n"
-            "입력은 메모 목록(JSON 배열)이고, 각 메모는 id/title/summary_bullets/category/tags를 가진다.\n\n"
-            "목표: 각 메모에 대해 카테고리별 추천 결과(JSON)를 반환.\n\n"
-            "규칙:\n"
-            "1) memo.category를 기준으로 묶어.\n"
-            "   - category가 너무 넓으면 tags를 참고해 더 직관적인 이름으로 바꿔도 됨.\n"
-            f"2) 카테고리는 최대 {max_categories}개.\n"
-            "3) 각 카테고리에는 emoji 1개, one_liner(커뮤니티 말투로 자극적인 한 줄 소개) 1개.\n"
-            "4) 각 카테고리 items는 입력된 메모 전부 포함.\n"
-            "5) 각 item에는:\n"
-            "   - memo_id: 입력의 id 그대로\n"
-            "   - title: 입력의 title 그대로\n"
-            "   - preview: summary_bullets 중 가장 '아 이거!' 싶은 1개\n"
-            "   - reason: 짧고 직관적으로 왜 지금 봐야 하는지\n"
-            "   - tags: 입력 tags 중 핵심 2~4개만\n"
-            "6) 말투: 친근 + 살짝 자극(커뮤니티 톤). 정보는 정확하게.\n"
-        ),
-        user=json.dumps(metas, ensure_ascii=False),
+    result = await claude_client.ask_json(
+        system=RECOMMENDER_SYSTEM,
+        user=json.dumps({"max_categories": max_categories, "memos": metas}, ensure_ascii=False),
         schema=RECOMMENDER_SCHEMA,
         max_tokens=1024,
+        cache=True,
+        priority=priority,
     )
     return result
 
+
+def stored_recommendation(memo: dict) -> dict:
+    """Recommendation for one memo from its stored analysis: fallback when the curator call fails."""
+    cat = (memo.get("category") or "").strip()
+    bullets = [str(b).strip() for b in memo.get("summary_bullets") or [] if str(b).strip()]
+    return {"categories": [{
+        "category": cat or "추천",
+        "emoji": CATEGORY_ICON.get(cat, "💡"),
+        "one_liner": "",
+        "items": [{
+            "memo_id": memo["id"],
+            "title": memo.get("title") or "",
+            "preview": _preview_from_bullets(bullets[1:]),
+            "hook": bullets[0] if bullets else "",
+            "reason": "",
+            "tags": list(memo.get("tags") or [])[:4],
+        }],
+    }]}
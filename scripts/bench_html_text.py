@@ -0,0 +1,105 @@
+"""Throughput comparison: legacy regex _strip_html vs streaming html_text extractor.
+
+Runs on a synthetic fixture corpus (nav/script-heavy pages, long articles,
+pages without <article>) so it needs no network or credentials:
+
+    python scripts/bench_html_text.py [--pages 200] [--budget 4000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.html_text import HtmlTextExtractor  # noqa: E402
+
+_CHUNK = 16 * 1024
+_WORDS = "메모 저장 분석 요약 기술 트렌드 에이전트 모델 서울 카페 data model agent search index cache".split()
+_MARKER = "ARTICLEBODY"
+
+
+def legacy_strip_html(html: str) -> str:
+    """extractor._strip_html before the streaming extractor replaced it."""
+    text = re.sub(r"<script[^>]*>.*?</script>", "", html, flags=re.S)
+    text = re.sub(r"<style[^>]*>.*?</style>", "", text, flags=re.S)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n)) + "."
+
+
+def _page(rng: random.Random, kind: str) -> str:
+    head = (
+        "<html><head><title>Fixture page</title>"
+        '<meta property="og:title" content="Fixture OG title">'
+        '<meta property="og:description" content="Fixture description of the page">'
+        + "".join(f"<style>.c{i}{{color:red;margin:{i}px}}</style>" for i in range(rng.randint(5, 40)))
+        + "".join(f"<script>var v{i} = '{'x' * 2000}';</script>" for i in range(rng.randint(5, 60)))
+        + "</head><body>"
+    )
+    nav = "<nav><ul>" + "".join(f"<li><a href='/{i}'>메뉴 {i}</a>" for i in range(rng.randint(20, 200))) + "</ul></nav>"
+    sidebar = "<div class='side'>" + "".join(f"<p>추천 링크 {_sentence(rng, 5)}</p>" for _ in range(rng.randint(10, 60))) + "</div>"
+    paragraphs = "".join(f"<p>{_MARKER} {_sentence(rng)}</p>" for _ in range(rng.randint(20, 400)))
+    footer = "<footer>" + "".join(f"<a href='/f{i}'>footer {i}</a>" for i in range(100)) + "</footer>"
+    if kind == "article":
+        body = nav + sidebar + f"<article><header><h1>Headline</h1></header>{paragraphs}</article>" + footer
+    else:
+        body = nav + sidebar + f"<div class='content'>{paragraphs}</div>" + footer
+    return head + body + "</body></html>"
+
+
+def _streaming(html: str, budget: int) -> str:
+    parser = HtmlTextExtractor(budget)
+    for i in range(0, len(html), _CHUNK):
+        parser.feed(html[i:i + _CHUNK])
+        if parser.done:
+            break
+    parser.close()
+    return parser.text()
+
+
+def _density(text: str) -> float:
+    """Share of output words that come from the article paragraphs."""
+    words = text.split()
+    if not words:
+        return 0.0
+    in_article = text.count(_MARKER) * 13  # marker + 12-word sentence
+    return min(1.0, in_article / len(words))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--budget", type=int, default=4000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [_page(rng, "article" if i % 3 else "plain") for i in range(args.pages)]
+    total_mb = sum(len(p) for p in corpus) / 1e6
+    print(f"corpus: {len(corpus)} pages, {total_mb:.1f} MB of HTML, budget={args.budget} chars")
+
+    for name, fn in (
+        ("regex _strip_html", lambda h: legacy_strip_html(h)[: args.budget]),
+        ("streaming html_text", lambda h: _streaming(h, args.budget)),
+    ):
+        t0 = time.perf_counter()
+        outputs = [fn(p) for p in corpus]
+        dt = time.perf_counter() - t0
+        density = sum(_density(o) for o in outputs) / len(outputs)
+        print(
+            f"{name:<22} {len(corpus) / dt:8.1f} pages/s  {total_mb / dt:7.1f} MB/s  "
+            f"article density {density:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+-- search_memos benchmark: 017 (rank and sort every match) vs 019 (newest 1000
+-- candidates, Hangul bigram index for two-syllable queries).
+--
+-- Builds a synthetic table in a scratch schema (nothing in public is touched),
+-- then times both function bodies on the same queries for one large chat:
+--
+--     createdb meemoo_bench
+--     psql -d meemoo_bench -v rows=500000 -f scripts/bench_search.sql
+--
+-- Needs pg_trgm and btree_gin (CREATE EXTENSION rights). Drop the schema afterwards:
+--     psql -d meemoo_bench -c 'DROP SCHEMA bench CASCADE'
+\set ON_ERROR_STOP on
+\if :{?rows}
+\else
+  \set rows 200000
+\endif
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+DROP SCHEMA IF EXISTS bench CASCADE;
+CREATE SCHEMA bench;
+SET search_path = bench, public;
+
+CREATE TABLE memos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    chat_id BIGINT NOT NULL,
+    title TEXT NOT NULL,
+    summary_bullets TEXT[] NOT NULL DEFAULT '{}',
+    category TEXT NOT NULL DEFAULT '',
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    source_url TEXT UNIQUE NOT NULL,
+    source_type TEXT NOT NULL DEFAULT 'web',
+    raw_content TEXT DEFAULT '',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Korean/English word soup; "에이전트", "벡터" and "vector" are rare, "모델" and
+-- "트렌드" are common. 90% of rows belong to chat 1, the rest to chat 2.
+-- The `WHERE i > 0` below correlates each subquery with the row so it is re-run per row.
+CREATE TEMP TABLE words AS
+SELECT unnest(ARRAY[
+    '메모', '저장', '분석', '요약', '기술', '트렌드', '모델', '서울', '카페', '여행',
+    '투자', '디자인', '개발', '회고', 'data', 'model', 'agent', 'search', 'index', 'cache'
+]) AS w;
+
+\echo 'Generating' :rows 'rows...'
+INSERT INTO memos (chat_id, title, summary_bullets, category, tags, source_url, raw_content, created_at)
+SELECT
+    CASE WHEN i % 10 = 0 THEN 2 ELSE 1 END,
+    (SELECT string_agg(w, ' ') FROM (SELECT w FROM words WHERE i > 0 ORDER BY random() LIMIT 4) t)
+        || CASE WHEN i % 997 = 0 THEN ' 에이전트' ELSE '' END,
+    ARRAY[
+        (SELECT string_agg(w, ' ') FROM (SELECT w FROM words WHERE i > 0 ORDER BY random() LIMIT 8) t),
+        (SELECT string_agg(w, ' ') FROM (SELECT w FROM words WHERE i > 0 ORDER BY random() LIMIT 8) t)
+    ],
+    (ARRAY['일', '배움', '아이디어', '정보', '기록', '문화', '소비'])[1 + i % 7],
+    ARRAY[(SELECT w FROM words WHERE i > 0 ORDER BY random() LIMIT 1), 'tag' || (i % 50)],
+    'https://example.com/' || i,
+    repeat((SELECT string_agg(w, ' ') FROM (SELECT w FROM words WHERE i > 0 ORDER BY random() LIMIT 12) t) || ' ', 40)
+        || CASE WHEN i % 5003 = 0 THEN ' vector' ELSE '' END
+        || CASE WHEN i % 1009 = 0 THEN ' 벡터' ELSE '' END,
+    now() - (i || ' minutes')::interval
+FROM generate_series(1, :rows) i;
+
+-- 010 generated column, then the 017 indexes
+\ir ../supabase/migrations/010_trgm_search.sql
+DROP FUNCTION search_memos(TEXT, INT, INT);
+DROP INDEX idx_memos_search_trgm;
+CREATE INDEX idx_memos_chat_created_id ON memos (chat_id, created_at DESC, id DESC);
+CREATE INDEX idx_memos_chat_search_trgm ON memos USING GIN (chat_id, search_text gin_trgm_ops);
+-- 019 sizes its probe from the chat's memo count
+CREATE TABLE category_counts AS
+SELECT chat_id, category, count(*) AS count FROM memos GROUP BY chat_id, category;
+
+-- 017 body, renamed
+CREATE FUNCTION search_memos_017(chat BIGINT, query TEXT, lim INT DEFAULT 5, off INT DEFAULT 0)
+RETURNS TABLE (id UUID, title TEXT, summary_bullets TEXT[], category TEXT, tags TEXT[],
+               source_url TEXT, source_type TEXT, created_at TIMESTAMPTZ, total_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    WITH pattern AS (
+        SELECT '%' || replace(replace(replace(query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pat
+    ),
+    ranked AS MATERIALIZED (
+        SELECT m.id, m.created_at,
+               m.title ILIKE p.pat AS in_title,
+               EXISTS (SELECT 1 FROM unnest(m.tags) t WHERE t ILIKE p.pat) AS in_tags,
+               word_similarity(query, m.title) AS score
+        FROM memos m, pattern p
+        WHERE m.chat_id = chat AND m.search_text ILIKE p.pat
+        ORDER BY in_title DESC, in_tags DESC, score DESC, m.created_at DESC
+        LIMIT 1000
+    ),
+    page AS (
+        SELECT r.*, row_number() OVER (
+            ORDER BY r.in_title DESC, r.in_tags DESC, r.score DESC, r.created_at DESC
+        ) AS rn
+        FROM ranked r ORDER BY rn OFFSET off LIMIT lim
+    )
+    SELECT m.id, m.title, m.summary_bullets, m.category, m.tags, m.source_url, m.source_type,
+           m.created_at, (SELECT count(*) FROM ranked) AS total_count
+    FROM page JOIN memos m ON m.id = page.id
+    ORDER BY page.rn;
+$$;
+
+\echo 'Applying 019 (bigram expression index + candidate-first search_memos)...'
+\timing on
+\ir ../supabase/migrations/019_search_candidates.sql
+\timing off
+VACUUM ANALYZE memos;
+
+SELECT count(*) AS rows, pg_size_pretty(pg_total_relation_size('memos')) AS table_size,
+       pg_size_pretty(pg_relation_size('idx_memos_chat_search_trgm')) AS trgm_index_size,
+       pg_size_pretty(pg_relation_size('idx_memos_chat_search_bigrams')) AS bigram_index_size
+FROM memos;
+
+-- Warm both paths once, then time each query (first page for chat 1, as /search does)
+\o /dev/null
+SELECT * FROM search_memos_017(1, '에이전트');
+SELECT * FROM search_memos(1, '에이전트');
+\o
+
+\timing on
+\echo '--- rare term (~0.1%): 에이전트'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, '에이전트');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, '에이전트');
+
+\echo '--- very rare term in raw_content (~0.02%): vector'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, 'vector');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, 'vector');
+
+\echo '--- common term (most rows): 트렌드'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, '트렌드');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, '트렌드');
+
+\echo '--- common two-syllable term: 모델'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, '모델');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, '모델');
+
+\echo '--- rare two-syllable term (~0.1%): 벡터'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, '벡터');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, '벡터');
+
+\echo '--- no match: zzqx'
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos_017(1, 'zzqx');
+SELECT count(*) AS rows_returned, max(total_count) AS total FROM search_memos(1, 'zzqx');
+\timing off
+
+\echo '--- plans (rare two-syllable term)'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT m.id FROM memos m WHERE m.chat_id = 1 AND m.search_text ILIKE '%벡터%';
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT m.id FROM memos m
+WHERE m.chat_id = 1 AND hangul_bigrams(m.search_text) @> ARRAY['벡터']
+ORDER BY m.created_at DESC, m.id DESC LIMIT 1000;
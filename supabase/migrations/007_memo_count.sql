@@ -0,0 +1,88 @@
+-- Trigger-maintained memo counter: /list reads the total instead of count(*) per page view
+CREATE TABLE IF NOT EXISTS memo_stats (
+    key TEXT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO memo_stats (key, value)
+SELECT 'total', count(*) FROM memos
+ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
+
+-- Statement-level with transition tables: a multi-row upsert/delete is one counter update.
+-- ON CONFLICT DO UPDATE rows are not in new_rows, so re-saving a URL does not count twice.
+CREATE OR REPLACE FUNCTION memo_stats_on_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE memo_stats SET value = value + (SELECT count(*) FROM new_rows) WHERE key = 'total';
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION memo_stats_on_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE memo_stats SET value = value - (SELECT count(*) FROM old_rows) WHERE key = 'total';
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION memo_stats_on_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE memo_stats SET value = 0 WHERE key = 'total';
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS memos_count_insert ON memos;
+CREATE TRIGGER memos_count_insert
+    AFTER INSERT ON memos
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memo_stats_on_insert();
+
+DROP TRIGGER IF EXISTS memos_count_delete ON memos;
+CREATE TRIGGER memos_count_delete
+    AFTER DELETE ON memos
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION memo_stats_on_delete();
+
+DROP TRIGGER IF EXISTS memos_count_truncate ON memos;
+CREATE TRIGGER memos_count_truncate
+    AFTER TRUNCATE ON memos
+    FOR EACH STATEMENT EXECUTE FUNCTION memo_stats_on_truncate();
+
+-- Newest-first page plus the counter total in one round trip
+CREATE INDEX IF NOT EXISTS idx_memos_created_at ON memos (created_at DESC);
+
+CREATE OR REPLACE FUNCTION list_memos_page(
+    lim INT DEFAULT 5,
+    off INT DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        m.id,
+        m.title,
+        m.summary_bullets,
+        m.category,
+        m.tags,
+        m.source_url,
+        m.source_type,
+        m.created_at,
+        (SELECT value FROM memo_stats WHERE key = 'total') AS total_count
+    FROM memos m
+    ORDER BY m.created_at DESC
+    OFFSET off
+    LIMIT lim;
+$$;
@@ -0,0 +1,61 @@
+-- Keyset pagination on (created_at, id) for /list and /category.
+-- Page N costs the same as page 1: the cursor is the last (or first) row shown,
+-- and the row comparison is answered from the composite index.
+CREATE INDEX IF NOT EXISTS idx_memos_created_id ON memos (created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_memos_created_at;
+
+-- Superseded by list_memos_keyset
+DROP FUNCTION IF EXISTS list_memos_page(int, int);
+
+-- Returns up to lim + 1 rows in traversal order (the extra row tells the caller
+-- whether another page exists): newest-first after the cursor, or oldest-first
+-- before it when backward. total_count is the memo_stats counter for the
+-- unfiltered list, NULL for a category.
+CREATE OR REPLACE FUNCTION list_memos_keyset(
+    lim INT DEFAULT 5,
+    cur_ts TIMESTAMPTZ DEFAULT NULL,
+    cur_id UUID DEFAULT NULL,
+    backward BOOLEAN DEFAULT FALSE,
+    cat TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    total BIGINT;
+BEGIN
+    IF cat IS NULL THEN
+        SELECT value INTO total FROM memo_stats WHERE key = 'total';
+    END IF;
+
+    IF backward THEN
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE (m.created_at, m.id) > (cur_ts, cur_id)
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at ASC, m.id ASC
+        LIMIT lim + 1;
+    ELSE
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE (cur_ts IS NULL OR (m.created_at, m.id) < (cur_ts, cur_id))
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT lim + 1;
+    END IF;
+END;
+$$;
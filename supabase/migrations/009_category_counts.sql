@@ -0,0 +1,151 @@
+-- Per-category memo counts kept current by triggers: /category reads a handful of rows
+-- instead of every memo's category.
+CREATE TABLE IF NOT EXISTS category_counts (
+    category TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0
+);
+
+TRUNCATE category_counts;
+INSERT INTO category_counts (category, count)
+SELECT category, count(*) FROM memos GROUP BY category;
+
+-- Statement-level with transition tables: a multi-row upsert is one update per touched category.
+-- Rows are applied in category order so concurrent writers lock counters in the same order.
+CREATE OR REPLACE FUNCTION category_counts_apply(deltas JSONB) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO category_counts (category, count)
+    SELECT d.key, d.value::BIGINT
+    FROM jsonb_each_text(deltas) d
+    ORDER BY d.key
+    ON CONFLICT (category) DO UPDATE SET count = category_counts.count + EXCLUDED.count;
+
+    DELETE FROM category_counts WHERE count <= 0;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_object_agg(category, n) FROM (
+            SELECT category, count(*) AS n FROM new_rows GROUP BY category
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_object_agg(category, -n) FROM (
+            SELECT category, count(*) AS n FROM old_rows GROUP BY category
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_object_agg(category, n) FROM (
+            SELECT category, sum(delta) AS n FROM (
+                SELECT category, 1 AS delta FROM new_rows
+                UNION ALL
+                SELECT category, -1 FROM old_rows
+            ) moved
+            GROUP BY category
+            HAVING sum(delta) <> 0
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM category_counts;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS memos_category_insert ON memos;
+CREATE TRIGGER memos_category_insert
+    AFTER INSERT ON memos
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION category_counts_on_insert();
+
+DROP TRIGGER IF EXISTS memos_category_delete ON memos;
+CREATE TRIGGER memos_category_delete
+    AFTER DELETE ON memos
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION category_counts_on_delete();
+
+-- Fires for ON CONFLICT DO UPDATE too (re-saved URL whose category changed)
+DROP TRIGGER IF EXISTS memos_category_update ON memos;
+CREATE TRIGGER memos_category_update
+    AFTER UPDATE ON memos
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION category_counts_on_update();
+
+DROP TRIGGER IF EXISTS memos_category_truncate ON memos;
+CREATE TRIGGER memos_category_truncate
+    AFTER TRUNCATE ON memos
+    FOR EACH STATEMENT EXECUTE FUNCTION category_counts_on_truncate();
+
+-- Category pages now get a total too: the sum of the matching counters
+CREATE OR REPLACE FUNCTION list_memos_keyset(
+    lim INT DEFAULT 5,
+    cur_ts TIMESTAMPTZ DEFAULT NULL,
+    cur_id UUID DEFAULT NULL,
+    backward BOOLEAN DEFAULT FALSE,
+    cat TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    total BIGINT;
+BEGIN
+    IF cat IS NULL THEN
+        SELECT value INTO total FROM memo_stats WHERE key = 'total';
+    ELSE
+        SELECT coalesce(sum(c.count), 0) INTO total
+        FROM category_counts c
+        WHERE c.category ILIKE '%' || cat || '%';
+    END IF;
+
+    IF backward THEN
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE (m.created_at, m.id) > (cur_ts, cur_id)
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at ASC, m.id ASC
+        LIMIT lim + 1;
+    ELSE
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE (cur_ts IS NULL OR (m.created_at, m.id) < (cur_ts, cur_id))
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT lim + 1;
+    END IF;
+END;
+$$;
@@ -0,0 +1,89 @@
+-- Indexed keyword search: one trigram GIN index over a generated search_text column
+-- replaces the per-column ILIKE sequential scan of 005.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- array_to_string is only STABLE; this wrapper is safe to declare IMMUTABLE because
+-- it only reads its arguments. Needed for the generated column.
+CREATE OR REPLACE FUNCTION memo_search_text(
+    title TEXT, category TEXT, tags TEXT[], summary_bullets TEXT[], raw_content TEXT
+) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT concat_ws(' ',
+        title,
+        category,
+        array_to_string(tags, ' '),
+        array_to_string(summary_bullets, ' '),
+        raw_content
+    );
+$$;
+
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (memo_search_text(title, category, tags, summary_bullets, raw_content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_memos_search_trgm ON memos USING GIN (search_text gin_trgm_ops);
+-- Superseded: search never used the title tsvector index
+DROP INDEX IF EXISTS idx_memos_title;
+
+-- Same signature as 005, so search_memos_text keeps working.
+-- Matches are ranked title hit > tag hit > title word similarity > newest, and only
+-- the top 1000 ids are kept, so total_count is capped at 1000.
+-- Full rows are fetched for the requested page only. LIKE wildcards in the query
+-- are matched literally. Queries shorter than 3 characters have no trigram to use
+-- and fall back to scanning the index.
+CREATE OR REPLACE FUNCTION search_memos(
+    query TEXT,
+    lim INT DEFAULT 5,
+    off INT DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH pattern AS (
+        SELECT '%' || replace(replace(replace(query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pat
+    ),
+    ranked AS MATERIALIZED (
+        SELECT
+            m.id,
+            m.created_at,
+            m.title ILIKE p.pat AS in_title,
+            EXISTS (SELECT 1 FROM unnest(m.tags) t WHERE t ILIKE p.pat) AS in_tags,
+            word_similarity(query, m.title) AS score
+        FROM memos m, pattern p
+        WHERE m.search_text ILIKE p.pat
+        ORDER BY in_title DESC, in_tags DESC, score DESC, m.created_at DESC
+        LIMIT 1000
+    ),
+    page AS (
+        SELECT r.*, row_number() OVER (
+            ORDER BY r.in_title DESC, r.in_tags DESC, r.score DESC, r.created_at DESC
+        ) AS rn
+        FROM ranked r
+        ORDER BY rn
+        OFFSET off
+        LIMIT lim
+    )
+    SELECT
+        m.id,
+        m.title,
+        m.summary_bullets,
+        m.category,
+        m.tags,
+        m.source_url,
+        m.source_type,
+        m.created_at,
+        (SELECT count(*) FROM ranked) AS total_count
+    FROM page
+    JOIN memos m ON m.id = page.id
+    ORDER BY page.rn;
+$$;
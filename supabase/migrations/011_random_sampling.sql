@@ -0,0 +1,67 @@
+-- Server-side random sampling over the whole table via a random-key index:
+-- jump to a random point in rand_key order and read the next row(s), wrapping
+-- around at the end. Each pick is one index probe; only the sampled rows are returned.
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS rand_key DOUBLE PRECISION NOT NULL DEFAULT random();
+
+CREATE INDEX IF NOT EXISTS idx_memos_rand_key ON memos (rand_key);
+CREATE INDEX IF NOT EXISTS idx_memos_category_rand_key ON memos (category, rand_key);
+
+-- n memos drawn across the whole table (morning push)
+CREATE OR REPLACE FUNCTION random_memos(n INT DEFAULT 1)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[]
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH p AS (SELECT random() AS r)
+    SELECT s.id, s.title, s.summary_bullets, s.category, s.tags
+    FROM p, LATERAL (
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m WHERE m.rand_key >= p.r ORDER BY m.rand_key LIMIT n)
+        UNION ALL
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m WHERE m.rand_key < p.r ORDER BY m.rand_key LIMIT n)
+        LIMIT n
+    ) s;
+$$;
+
+-- per_category memos from each of max_categories randomly chosen categories
+-- (recommendations). Categories come from the category_counts rollup.
+CREATE OR REPLACE FUNCTION random_memos_by_category(
+    per_category INT DEFAULT 1,
+    max_categories INT DEFAULT 3
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[]
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH cats AS (
+        SELECT c.category, random() AS r
+        FROM category_counts c
+        WHERE c.count > 0
+        ORDER BY random()
+        LIMIT max_categories
+    )
+    SELECT s.id, s.title, s.summary_bullets, s.category, s.tags
+    FROM cats, LATERAL (
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m
+         WHERE m.category = cats.category AND m.rand_key >= cats.r
+         ORDER BY m.rand_key LIMIT per_category)
+        UNION ALL
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m
+         WHERE m.category = cats.category AND m.rand_key < cats.r
+         ORDER BY m.rand_key LIMIT per_category)
+        LIMIT per_category
+    ) s;
+$$;
@@ -0,0 +1,43 @@
+-- Indexed short-id (UUID prefix) lookup for /view and /delete.
+-- find_memo_by_prefix (004) ran `id::text LIKE prefix || '%'`, which no index served.
+-- A "C"-collated expression index answers the equivalent range
+-- [prefix, prefix || 'g'): UUID text is 0-9, a-f and '-', all below 'g'.
+CREATE INDEX IF NOT EXISTS idx_memos_id_text ON memos ((id::text) COLLATE "C");
+
+DROP FUNCTION IF EXISTS find_memo_by_prefix(text);
+
+-- Up to 2 matches: the caller treats 2 as "ambiguous prefix"
+CREATE OR REPLACE FUNCTION find_memos_by_prefix(prefix TEXT)
+RETURNS SETOF memos
+LANGUAGE sql STABLE AS $$
+    SELECT *
+    FROM memos m
+    WHERE (m.id::text COLLATE "C") >= lower(prefix)
+      AND (m.id::text COLLATE "C") < lower(prefix) || 'g'
+    LIMIT 2;
+$$;
+
+-- Delete the memo the prefix identifies, in one call. Deletes nothing unless the
+-- prefix matches exactly one memo; matches is 0, 1 or 2 (2 = ambiguous).
+CREATE OR REPLACE FUNCTION delete_memo_by_prefix(prefix TEXT)
+RETURNS TABLE (deleted_id UUID, matches INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids UUID[];
+BEGIN
+    SELECT array_agg(m.id) INTO ids
+    FROM (
+        SELECT memos.id FROM memos
+        WHERE (memos.id::text COLLATE "C") >= lower(prefix)
+          AND (memos.id::text COLLATE "C") < lower(prefix) || 'g'
+        LIMIT 2
+    ) m;
+
+    IF coalesce(cardinality(ids), 0) = 1 THEN
+        DELETE FROM memos WHERE memos.id = ids[1];
+        RETURN QUERY SELECT ids[1], 1;
+    ELSE
+        RETURN QUERY SELECT NULL::UUID, coalesce(cardinality(ids), 0);
+    END IF;
+END;
+$$;
@@ -0,0 +1,80 @@
+-- Semantic search, take two: 003/004 added an embedding column nothing filled (dropped in 006).
+-- Now the app embeds on save (app/embeddings.py) and `python -m app.embeddings --backfill`
+-- fills older rows. 256 dims: the local hash embedder and OpenAI text-embedding-3-* (dimensions=256).
+CREATE EXTENSION IF NOT EXISTS vector;
+
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS embedding vector(256);
+-- Which embedder produced the vector; only vectors from the same model are compared
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_memos_embedding_hnsw
+    ON memos USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Top-k nearest memos by cosine similarity (HNSW). Rows from another model are
+-- filtered after the index scan, so keep one model per table (run the backfill
+-- after switching providers).
+CREATE OR REPLACE FUNCTION match_memos(
+    query_embedding vector(256),
+    model TEXT,
+    match_count INT DEFAULT 10,
+    exclude_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 64
+AS $$
+    SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+           m.source_url, m.source_type, m.created_at,
+           1 - (m.embedding <=> query_embedding) AS similarity
+    FROM memos m
+    WHERE m.embedding IS NOT NULL
+      AND m.embedding_model = model
+      AND (exclude_id IS NULL OR m.id <> exclude_id)
+    ORDER BY m.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+-- Neighbours of a stored memo in one call (the vector never leaves the database)
+CREATE OR REPLACE FUNCTION similar_memos(memo_id UUID, match_count INT DEFAULT 5)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT s.*
+    FROM memos src,
+         LATERAL match_memos(src.embedding, src.embedding_model, match_count, src.id) s
+    WHERE src.id = memo_id AND src.embedding IS NOT NULL;
+$$;
+
+-- Bulk write for the embedding backfill: rows = [{"id": ..., "embedding": [...]}, ...]
+CREATE OR REPLACE FUNCTION set_memo_embeddings(rows JSONB, model TEXT)
+RETURNS INT
+LANGUAGE sql AS $$
+    WITH upd AS (
+        UPDATE memos m
+        SET embedding = (r.embedding::text)::vector, embedding_model = model
+        FROM jsonb_to_recordset(rows) AS r(id UUID, embedding JSONB)
+        WHERE m.id = r.id
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM upd;
+$$;
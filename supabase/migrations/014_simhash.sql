@@ -0,0 +1,32 @@
+-- Near-duplicate detection: 64-bit SimHash of the extracted text / pasted memo,
+-- stored with its 4 x 16-bit LSH band keys (band index in the high bits).
+-- Any fingerprint within Hamming distance 3 shares at least one band key, so the
+-- GIN overlap lookup finds every candidate; the exact distance is checked after.
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS simhash BIGINT;
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS simhash_bands INT[];
+
+CREATE INDEX IF NOT EXISTS idx_memos_simhash_bands ON memos USING GIN (simhash_bands);
+
+CREATE OR REPLACE FUNCTION find_near_duplicate(
+    fp BIGINT,
+    fp_bands INT[],
+    max_distance INT DEFAULT 3
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    category TEXT,
+    source_type TEXT,
+    source_url TEXT,
+    distance INT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT m.id, m.title, m.category, m.source_type, m.source_url,
+           bit_count((m.simhash # fp)::bit(64))::INT AS distance
+    FROM memos m
+    WHERE m.simhash_bands && fp_bands
+      AND bit_count((m.simhash # fp)::bit(64)) <= max_distance
+    ORDER BY distance, m.created_at DESC
+    LIMIT 1;
+$$;
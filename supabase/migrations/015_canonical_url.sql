@@ -0,0 +1,13 @@
+-- Dedup on a canonical URL instead of the raw source_url string.
+-- The app computes canonical_url (app/urls.py: tracking params, x.com/twitter.com,
+-- m./www., AMP, youtu.be, trailing slashes, ...) and upserts on it.
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS canonical_url TEXT;
+
+-- Baseline for existing rows; `python -m app.urls --backfill` then applies the real rules
+UPDATE memos SET canonical_url = source_url WHERE canonical_url IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_memos_canonical_url ON memos (canonical_url);
+
+-- source_url stays as sent (minus tracking params) and is no longer unique:
+-- two spellings of one article now collide on canonical_url instead
+ALTER TABLE memos DROP CONSTRAINT IF EXISTS memos_source_url_key;
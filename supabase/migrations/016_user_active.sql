@@ -0,0 +1,6 @@
+-- Scheduled pushes skip chats that blocked the bot or were deleted.
+-- The broadcaster sets active = false on Forbidden / "chat not found";
+-- the next message from that chat sets it back to true.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS active BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_active ON users (chat_id) WHERE active;
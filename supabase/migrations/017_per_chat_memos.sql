@@ -0,0 +1,435 @@
+-- Per-chat memo collections. Every memo belongs to the chat that saved it. Every
+-- read path filters on chat_id through an index that leads on it, so a chat's
+-- queries scale with its own collection, not with the whole table.
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+ALTER TABLE memos ADD COLUMN IF NOT EXISTS chat_id BIGINT;
+
+-- Existing memos predate owners: they all go to the first registered chat (the bot's
+-- original single user), or to chat 0 if nobody has registered yet. Hand them to
+-- someone else afterwards with reassign_memos (below).
+UPDATE memos
+SET chat_id = coalesce((SELECT u.chat_id FROM users u ORDER BY u.created_at LIMIT 1), 0)
+WHERE chat_id IS NULL;
+ALTER TABLE memos ALTER COLUMN chat_id SET NOT NULL;
+
+-- ── Indexes lead on chat_id ──────────────────────────────────
+CREATE INDEX IF NOT EXISTS idx_memos_chat_created_id ON memos (chat_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_memos_created_id;
+
+-- The same URL may be saved once per chat
+CREATE UNIQUE INDEX IF NOT EXISTS idx_memos_chat_canonical_url ON memos (chat_id, canonical_url);
+DROP INDEX IF EXISTS idx_memos_canonical_url;
+
+CREATE INDEX IF NOT EXISTS idx_memos_chat_rand_key ON memos (chat_id, rand_key);
+CREATE INDEX IF NOT EXISTS idx_memos_chat_category_rand_key ON memos (chat_id, category, rand_key);
+DROP INDEX IF EXISTS idx_memos_rand_key;
+DROP INDEX IF EXISTS idx_memos_category_rand_key;
+
+-- btree_gin: the trigram and band GIN indexes carry chat_id too
+CREATE INDEX IF NOT EXISTS idx_memos_chat_search_trgm ON memos USING GIN (chat_id, search_text gin_trgm_ops);
+DROP INDEX IF EXISTS idx_memos_search_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_memos_chat_simhash_bands ON memos USING GIN (chat_id, simhash_bands);
+DROP INDEX IF EXISTS idx_memos_simhash_bands;
+
+-- idx_memos_id_text (012) stays global: a UUID prefix narrows to a row or two anyway.
+-- HNSW cannot lead on chat_id; match_memos uses pgvector 0.8 iterative scans instead.
+
+-- ── Per-chat counters: category_counts keyed by (chat_id, category) ──
+-- Per-chat totals are the sum of a chat's category rows. The global memo_stats
+-- counter (007) has no reader left; drop it and its statement triggers so saves
+-- stop serializing on its single row. list_memos_page (007) went away in 008.
+DROP TRIGGER IF EXISTS memos_count_insert ON memos;
+DROP TRIGGER IF EXISTS memos_count_delete ON memos;
+DROP TRIGGER IF EXISTS memos_count_truncate ON memos;
+DROP FUNCTION IF EXISTS memo_stats_on_insert();
+DROP FUNCTION IF EXISTS memo_stats_on_delete();
+DROP FUNCTION IF EXISTS memo_stats_on_truncate();
+DROP FUNCTION IF EXISTS list_memos_page(int, int);
+DROP TABLE IF EXISTS memo_stats;
+
+ALTER TABLE category_counts ADD COLUMN IF NOT EXISTS chat_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE category_counts DROP CONSTRAINT IF EXISTS category_counts_pkey;
+TRUNCATE category_counts;
+ALTER TABLE category_counts ADD PRIMARY KEY (chat_id, category);
+ALTER TABLE category_counts ALTER COLUMN chat_id DROP DEFAULT;
+
+INSERT INTO category_counts (chat_id, category, count)
+SELECT chat_id, category, count(*) FROM memos GROUP BY chat_id, category;
+
+-- deltas = [{"chat_id": ..., "category": ..., "n": ...}, ...]; applied in key order
+-- so concurrent writers lock counters in the same order.
+CREATE OR REPLACE FUNCTION category_counts_apply(deltas JSONB) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO category_counts (chat_id, category, count)
+    SELECT d.chat_id, d.category, d.n
+    FROM jsonb_to_recordset(deltas) AS d(chat_id BIGINT, category TEXT, n BIGINT)
+    ORDER BY d.chat_id, d.category
+    ON CONFLICT (chat_id, category) DO UPDATE SET count = category_counts.count + EXCLUDED.count;
+
+    DELETE FROM category_counts c
+    USING jsonb_to_recordset(deltas) AS d(chat_id BIGINT, category TEXT, n BIGINT)
+    WHERE c.chat_id = d.chat_id AND c.category = d.category AND c.count <= 0;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_agg(jsonb_build_object('chat_id', chat_id, 'category', category, 'n', n)) FROM (
+            SELECT chat_id, category, count(*) AS n FROM new_rows GROUP BY chat_id, category
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_agg(jsonb_build_object('chat_id', chat_id, 'category', category, 'n', -n)) FROM (
+            SELECT chat_id, category, count(*) AS n FROM old_rows GROUP BY chat_id, category
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION category_counts_on_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM category_counts_apply(
+        (SELECT jsonb_agg(jsonb_build_object('chat_id', chat_id, 'category', category, 'n', n)) FROM (
+            SELECT chat_id, category, sum(delta) AS n FROM (
+                SELECT chat_id, category, 1 AS delta FROM new_rows
+                UNION ALL
+                SELECT chat_id, category, -1 FROM old_rows
+            ) moved
+            GROUP BY chat_id, category
+            HAVING sum(delta) <> 0
+        ) d)
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- Move every memo of one chat to another (e.g. the memos assigned above). URLs the
+-- target already saved stay behind. The update trigger moves the category counts.
+CREATE OR REPLACE FUNCTION reassign_memos(from_chat BIGINT, to_chat BIGINT) RETURNS INT
+LANGUAGE sql AS $$
+    WITH moved AS (
+        UPDATE memos m SET chat_id = to_chat
+        WHERE m.chat_id = from_chat
+          AND NOT EXISTS (
+              SELECT 1 FROM memos t WHERE t.chat_id = to_chat AND t.canonical_url = m.canonical_url
+          )
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM moved;
+$$;
+
+-- ── RPCs take the owning chat ────────────────────────────────
+DROP FUNCTION IF EXISTS list_memos_keyset(INT, TIMESTAMPTZ, UUID, BOOLEAN, TEXT);
+DROP FUNCTION IF EXISTS search_memos(TEXT, INT, INT);
+DROP FUNCTION IF EXISTS random_memos(INT);
+DROP FUNCTION IF EXISTS random_memos_by_category(INT, INT);
+DROP FUNCTION IF EXISTS find_memos_by_prefix(TEXT);
+DROP FUNCTION IF EXISTS delete_memo_by_prefix(TEXT);
+DROP FUNCTION IF EXISTS similar_memos(UUID, INT);
+DROP FUNCTION IF EXISTS match_memos(vector, TEXT, INT, UUID);
+DROP FUNCTION IF EXISTS find_near_duplicate(BIGINT, INT[], INT);
+
+CREATE OR REPLACE FUNCTION list_memos_keyset(
+    chat BIGINT,
+    lim INT DEFAULT 5,
+    cur_ts TIMESTAMPTZ DEFAULT NULL,
+    cur_id UUID DEFAULT NULL,
+    backward BOOLEAN DEFAULT FALSE,
+    cat TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    total BIGINT;
+BEGIN
+    SELECT coalesce(sum(c.count), 0) INTO total
+    FROM category_counts c
+    WHERE c.chat_id = chat
+      AND (cat IS NULL OR c.category ILIKE '%' || cat || '%');
+
+    IF backward THEN
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE m.chat_id = chat
+          AND (m.created_at, m.id) > (cur_ts, cur_id)
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at ASC, m.id ASC
+        LIMIT lim + 1;
+    ELSE
+        RETURN QUERY
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at, total
+        FROM memos m
+        WHERE m.chat_id = chat
+          AND (cur_ts IS NULL OR (m.created_at, m.id) < (cur_ts, cur_id))
+          AND (cat IS NULL OR m.category ILIKE '%' || cat || '%')
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT lim + 1;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_memos(
+    chat BIGINT,
+    query TEXT,
+    lim INT DEFAULT 5,
+    off INT DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH pattern AS (
+        SELECT '%' || replace(replace(replace(query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pat
+    ),
+    ranked AS MATERIALIZED (
+        SELECT
+            m.id,
+            m.created_at,
+            m.title ILIKE p.pat AS in_title,
+            EXISTS (SELECT 1 FROM unnest(m.tags) t WHERE t ILIKE p.pat) AS in_tags,
+            word_similarity(query, m.title) AS score
+        FROM memos m, pattern p
+        WHERE m.chat_id = chat
+          AND m.search_text ILIKE p.pat
+        ORDER BY in_title DESC, in_tags DESC, score DESC, m.created_at DESC
+        LIMIT 1000
+    ),
+    page AS (
+        SELECT r.*, row_number() OVER (
+            ORDER BY r.in_title DESC, r.in_tags DESC, r.score DESC, r.created_at DESC
+        ) AS rn
+        FROM ranked r
+        ORDER BY rn
+        OFFSET off
+        LIMIT lim
+    )
+    SELECT
+        m.id,
+        m.title,
+        m.summary_bullets,
+        m.category,
+        m.tags,
+        m.source_url,
+        m.source_type,
+        m.created_at,
+        (SELECT count(*) FROM ranked) AS total_count
+    FROM page
+    JOIN memos m ON m.id = page.id
+    ORDER BY page.rn;
+$$;
+
+CREATE OR REPLACE FUNCTION random_memos(chat BIGINT, n INT DEFAULT 1)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[]
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH p AS (SELECT random() AS r)
+    SELECT s.id, s.title, s.summary_bullets, s.category, s.tags
+    FROM p, LATERAL (
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m WHERE m.chat_id = chat AND m.rand_key >= p.r ORDER BY m.rand_key LIMIT n)
+        UNION ALL
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m WHERE m.chat_id = chat AND m.rand_key < p.r ORDER BY m.rand_key LIMIT n)
+        LIMIT n
+    ) s;
+$$;
+
+CREATE OR REPLACE FUNCTION random_memos_by_category(
+    chat BIGINT,
+    per_category INT DEFAULT 1,
+    max_categories INT DEFAULT 3
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[]
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH cats AS (
+        SELECT c.category, random() AS r
+        FROM category_counts c
+        WHERE c.chat_id = chat AND c.count > 0
+        ORDER BY random()
+        LIMIT max_categories
+    )
+    SELECT s.id, s.title, s.summary_bullets, s.category, s.tags
+    FROM cats, LATERAL (
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m
+         WHERE m.chat_id = chat AND m.category = cats.category AND m.rand_key >= cats.r
+         ORDER BY m.rand_key LIMIT per_category)
+        UNION ALL
+        (SELECT m.id, m.title, m.summary_bullets, m.category, m.tags
+         FROM memos m
+         WHERE m.chat_id = chat AND m.category = cats.category AND m.rand_key < cats.r
+         ORDER BY m.rand_key LIMIT per_category)
+        LIMIT per_category
+    ) s;
+$$;
+
+CREATE OR REPLACE FUNCTION find_memos_by_prefix(chat BIGINT, prefix TEXT)
+RETURNS SETOF memos
+LANGUAGE sql STABLE AS $$
+    SELECT *
+    FROM memos m
+    WHERE (m.id::text COLLATE "C") >= lower(prefix)
+      AND (m.id::text COLLATE "C") < lower(prefix) || 'g'
+      AND m.chat_id = chat
+    LIMIT 2;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_memo_by_prefix(chat BIGINT, prefix TEXT)
+RETURNS TABLE (deleted_id UUID, matches INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids UUID[];
+BEGIN
+    SELECT array_agg(m.id) INTO ids
+    FROM (
+        SELECT memos.id FROM memos
+        WHERE (memos.id::text COLLATE "C") >= lower(prefix)
+          AND (memos.id::text COLLATE "C") < lower(prefix) || 'g'
+          AND memos.chat_id = chat
+        LIMIT 2
+    ) m;
+
+    IF coalesce(cardinality(ids), 0) = 1 THEN
+        DELETE FROM memos WHERE memos.id = ids[1];
+        RETURN QUERY SELECT ids[1], 1;
+    ELSE
+        RETURN QUERY SELECT NULL::UUID, coalesce(cardinality(ids), 0);
+    END IF;
+END;
+$$;
+
+-- The HNSW scan keeps going (iterative scan, pgvector 0.8+) until match_count rows of
+-- this chat are found; relaxed_order results are re-sorted by distance.
+CREATE OR REPLACE FUNCTION match_memos(
+    chat BIGINT,
+    query_embedding vector(256),
+    model TEXT,
+    match_count INT DEFAULT 10,
+    exclude_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 64
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+    WITH nearest AS MATERIALIZED (
+        SELECT m.id, m.title, m.summary_bullets, m.category, m.tags,
+               m.source_url, m.source_type, m.created_at,
+               m.embedding <=> query_embedding AS distance
+        FROM memos m
+        WHERE m.embedding IS NOT NULL
+          AND m.chat_id = chat
+          AND m.embedding_model = model
+          AND (exclude_id IS NULL OR m.id <> exclude_id)
+        ORDER BY m.embedding <=> query_embedding
+        LIMIT match_count
+    )
+    SELECT n.id, n.title, n.summary_bullets, n.category, n.tags,
+           n.source_url, n.source_type, n.created_at, 1 - n.distance AS similarity
+    FROM nearest n
+    ORDER BY n.distance;
+$$;
+
+CREATE OR REPLACE FUNCTION similar_memos(chat BIGINT, memo_id UUID, match_count INT DEFAULT 5)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT s.*
+    FROM memos src,
+         LATERAL match_memos(chat, src.embedding, src.embedding_model, match_count, src.id) s
+    WHERE src.id = memo_id AND src.chat_id = chat AND src.embedding IS NOT NULL;
+$$;
+
+CREATE OR REPLACE FUNCTION find_near_duplicate(
+    chat BIGINT,
+    fp BIGINT,
+    fp_bands INT[],
+    max_distance INT DEFAULT 3
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    category TEXT,
+    source_type TEXT,
+    source_url TEXT,
+    distance INT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT m.id, m.title, m.category, m.source_type, m.source_url,
+           bit_count((m.simhash # fp)::bit(64))::INT AS distance
+    FROM memos m
+    WHERE m.chat_id = chat
+      AND m.simhash_bands && fp_bands
+      AND bit_count((m.simhash # fp)::bit(64)) <= max_distance
+    ORDER BY distance, m.created_at DESC
+    LIMIT 1;
+$$;
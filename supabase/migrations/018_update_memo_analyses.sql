@@ -0,0 +1,31 @@
+-- Re-analysis write-back (app/backfill.py) as an UPDATE only. The old upsert on id
+-- re-inserted memos deleted while a batch was running, as partial rows.
+-- New title/bullets/tags make the stored vector stale: it is cleared here so the
+-- row is re-embedded (by the backfill right away, or `python -m app.embeddings --backfill`).
+-- rows = [{"id", "title", "summary_bullets", "category", "tags"}, ...]
+CREATE OR REPLACE FUNCTION update_memo_analyses(rows JSONB)
+RETURNS TABLE (
+    id UUID,
+    chat_id BIGINT,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    raw_content TEXT,
+    created_at TIMESTAMPTZ
+)
+LANGUAGE sql AS $$
+    UPDATE memos m
+    SET title = r.title,
+        summary_bullets = r.summary_bullets,
+        category = r.category,
+        tags = r.tags,
+        embedding = NULL,
+        embedding_model = NULL
+    FROM jsonb_to_recordset(rows) AS r(id UUID, title TEXT, summary_bullets TEXT[], category TEXT, tags TEXT[])
+    WHERE m.id = r.id
+    RETURNING m.id, m.chat_id, m.title, m.summary_bullets, m.category, m.tags,
+              m.source_url, m.source_type, m.raw_content, m.created_at;
+$$;
@@ -0,0 +1,135 @@
+-- search_memos without the full sort, and an index path for two-character Hangul.
+--
+-- 017 ranked every match (title/tag hit, word_similarity) and sorted them all before
+-- keeping 1000, and every match also paid an ILIKE recheck: a common word meant
+-- reading and scoring most of the chat. Now only the chat's newest 1000 matches are
+-- ranked, and they are found one of two ways:
+--   * rare words: every match comes from the index (at most `probe` of them);
+--   * common words (more than `probe` matches): the chat's newest rows are read in
+--     order until 1000 match, which takes about 1000 / selectivity rows.
+-- probe = sqrt(1000 * chat size) is where the two cost the same, so neither path
+-- reads more than about 2 * probe rows.
+--
+-- A two-character query ("모델") has no trigram, so 017 read the whole trigram index
+-- and rechecked every row. Hangul bigrams of search_text get their own expression
+-- index; a two-syllable query becomes one array lookup. Other one- and two-character
+-- queries walk the chat newest first.
+
+-- Distinct Hangul syllable bigrams of t, as the search replica indexes Hangul runs.
+-- Expensive per row: the COST keeps the planner on the index rather than a filter.
+CREATE OR REPLACE FUNCTION hangul_bigrams(t TEXT) RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE COST 10000
+AS $$
+    SELECT coalesce(array_agg(DISTINCT substr(r.run, i, 2)), '{}')
+    FROM regexp_matches(coalesce(t, ''), '[가-힣]{2,}', 'g') AS g(m),
+         LATERAL (SELECT g.m[1] AS run) r,
+         generate_series(1, char_length(r.run) - 1) AS i;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_memos_chat_search_bigrams
+    ON memos USING GIN (chat_id, hangul_bigrams(search_text));
+
+DROP FUNCTION IF EXISTS search_memos(BIGINT, TEXT, INT, INT);
+
+-- Ranked title hit > tag hit > title word similarity > newest within the newest 1000
+-- matches; total_count is capped at 1000. force_custom_plan: the pattern decides
+-- which index applies, so a cached generic plan would be wrong.
+CREATE OR REPLACE FUNCTION search_memos(
+    chat BIGINT,
+    query TEXT,
+    lim INT DEFAULT 5,
+    off INT DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    summary_bullets TEXT[],
+    category TEXT,
+    tags TEXT[],
+    source_url TEXT,
+    source_type TEXT,
+    created_at TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE plpgsql STABLE
+SET plan_cache_mode = force_custom_plan
+AS $$
+DECLARE
+    pat TEXT := '%' || replace(replace(replace(query, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+    chat_rows BIGINT;
+    probe INT;
+    ids UUID[];
+BEGIN
+    SELECT coalesce(sum(c.count), 0) INTO chat_rows FROM category_counts c WHERE c.chat_id = chat;
+    probe := greatest(1000, ceil(sqrt(1000.0 * chat_rows)))::INT;
+
+    IF query ~ '^[가-힣]{2}$' THEN
+        SELECT array_agg(c.id ORDER BY c.created_at DESC, c.id DESC) INTO ids FROM (
+            SELECT m.id, m.created_at FROM memos m
+            WHERE m.chat_id = chat
+              AND hangul_bigrams(m.search_text) @> ARRAY[query]
+            LIMIT probe + 1
+        ) c;
+        ids := coalesce(ids, '{}');
+    ELSIF char_length(query) >= 3 THEN
+        SELECT array_agg(c.id ORDER BY c.created_at DESC, c.id DESC) INTO ids FROM (
+            SELECT m.id, m.created_at FROM memos m
+            WHERE m.chat_id = chat
+              AND m.search_text ILIKE pat
+            LIMIT probe + 1
+        ) c;
+        ids := coalesce(ids, '{}');
+    END IF;
+
+    IF ids IS NULL OR cardinality(ids) > probe THEN
+        -- Common word, or no index for the query: read the newest rows until 1000 match.
+        -- The inner LIMIT keeps the planner on (chat_id, created_at, id) in order.
+        SELECT coalesce(array_agg(n.id), '{}') INTO ids FROM (
+            SELECT w.id FROM (
+                SELECT m.id, m.search_text FROM memos m
+                WHERE m.chat_id = chat
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT chat_rows
+            ) w
+            WHERE w.search_text ILIKE pat
+            LIMIT 1000
+        ) n;
+    ELSE
+        ids := ids[1:1000];
+    END IF;
+
+    RETURN QUERY
+    WITH ranked AS MATERIALIZED (
+        SELECT
+            m.id,
+            m.created_at,
+            m.title ILIKE pat AS in_title,
+            EXISTS (SELECT 1 FROM unnest(m.tags) t WHERE t ILIKE pat) AS in_tags,
+            word_similarity(query, m.title) AS score
+        FROM memos m
+        WHERE m.id = ANY (ids)
+    ),
+    page AS (
+        SELECT r.id, row_number() OVER (
+            ORDER BY r.in_title DESC, r.in_tags DESC, r.score DESC, r.created_at DESC
+        ) AS rn
+        FROM ranked r
+        ORDER BY rn
+        OFFSET off
+        LIMIT lim
+    )
+    SELECT
+        m.id,
+        m.title,
+        m.summary_bullets,
+        m.category,
+        m.tags,
+        m.source_url,
+        m.source_type,
+        m.created_at,
+        cardinality(ids)::BIGINT
+    FROM page
+    JOIN memos m ON m.id = page.id
+    ORDER BY page.rn;
+END;
+$$;
@@ -0,0 +1,32 @@
+from app.disk_cache import DiskCache
+
+
+def test_roundtrip_and_delete(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.sqlite3"), max_bytes=1 << 20)
+    cache.set("a", {"text": "가나다"})
+    value, stored_at = cache.get("a")
+    assert value == {"text": "가나다"} and stored_at > 0
+    cache.set("a", {"text": "x"})
+    assert cache.info()["entries"] == 1
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert cache.info() == {"entries": 0, "bytes": 0}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.sqlite3"), max_bytes=250)
+    for key in "abcd":
+        cache.set(key, {"v": key * 50})  # 59 bytes each
+    cache.get("a")  # a is now the most recently used
+    cache.set("e", {"v": "e" * 50})
+    assert cache.info() == {"entries": 3, "bytes": 177}
+    assert cache.get("b") is None and cache.get("c") is None
+    assert all(cache.get(k) is not None for k in "ade")
+
+
+def test_counters_survive_reopen(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = DiskCache(path, max_bytes=1 << 20)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert DiskCache(path, max_bytes=1 << 20).info() == cache.info()
@@ -0,0 +1,37 @@
+from app.html_text import HtmlTextExtractor, extract_main_text
+
+BODY = "본문 문단입니다. " * 40
+
+
+def test_page_wrapped_in_a_form_keeps_its_body():
+    doc = (
+        "<html><head><title>제목</title></head><body><form id='aspnetForm' method='post'>"
+        f"<input type='hidden' name='__VIEWSTATE' value='x'/><div>{BODY}</div>"
+        "<select><option>옵션</option></select><button>전송</button></form></body></html>"
+    )
+    text = extract_main_text(doc, 4000)
+    assert text.startswith("제목\n본문 문단입니다.")
+    assert "옵션" not in text and "전송" not in text
+
+
+def test_unclosed_form_does_not_swallow_the_rest():
+    assert "본문" in extract_main_text(f"<html><body><form><div>{BODY}</div></body></html>", 4000)
+
+
+def test_empty_main_falls_back_to_body_text():
+    assert "본문" in extract_main_text(f"<html><body><main></main><p>{BODY}</p></body></html>", 4000)
+
+
+def test_article_preferred_over_chrome():
+    doc = f"<body><nav>메뉴</nav><div>광고 문구</div><article>{BODY}</article><footer>푸터</footer></body>"
+    text = extract_main_text(doc, 4000)
+    assert "본문" in text and "메뉴" not in text and "광고" not in text and "푸터" not in text
+
+
+def test_chunked_feed_matches_one_shot():
+    doc = f"<html><head><title>T</title></head><body><article><p>{BODY}</p><script>if (a < b) {{}}</script></article></body></html>"
+    parser = HtmlTextExtractor(4000)
+    for i in range(0, len(doc), 7):
+        parser.feed(doc[i:i + 7])
+    parser.close()
+    assert parser.text() == extract_main_text(doc, 4000)
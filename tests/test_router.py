@@ -0,0 +1,22 @@
+from app.router import route, split_url
+
+
+def test_split_url_removes_the_url_as_typed():
+    url, rest = split_url("읽어볼 것 https://example.com/a?utm_source=tw&id=3#comments 나중에")
+    assert url == "https://example.com/a?id=3"
+    assert rest == "읽어볼 것  나중에"
+
+
+def test_split_url_url_only_leaves_no_context():
+    for text in ("https://example.com/a%20b?foo", "https://example.com/x#frag", "https://example.com/?utm_source=x"):
+        assert split_url(text)[1] == ""
+
+
+def test_split_url_bare_domain_and_plain_text():
+    assert split_url("griddyicons.com 아이콘 모음") == ("https://griddyicons.com", "아이콘 모음")
+    assert split_url("그냥 메모입니다") == ("", "그냥 메모입니다")
+
+
+def test_route():
+    assert route("/search 에이전트") == ("librarian", "search:에이전트")
+    assert route("https://example.com")[0] == "analyst"
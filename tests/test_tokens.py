@@ -0,0 +1,17 @@
+from app.search_replica import match_query
+from app.tokens import grams, words
+
+
+def test_hangul_runs_become_bigrams():
+    assert grams("에이전트설계 Agent") == "에이 이전 전트 트설 설계 agent"
+
+
+def test_single_syllable_and_punctuation():
+    assert grams("나, AI_툴!") == "나 ai 툴"
+    assert words("") == []
+
+
+def test_match_query_phrases_hangul_and_prefixes_words():
+    assert match_query("전트설 Vec") == '"전트 트설" AND "vec"*'
+    assert match_query("가") == '"가"*'
+    assert match_query("!!") is None
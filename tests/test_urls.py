@@ -0,0 +1,48 @@
+from app.urls import canonicalize, clean_url
+
+
+def test_clean_url_drops_tracking_params_and_fragment():
+    assert clean_url("https://example.com/a?utm_source=tw&id=3#comments") == "https://example.com/a?id=3"
+    assert clean_url("https://example.com/a?fbclid=x") == "https://example.com/a"
+
+
+def test_clean_url_keeps_the_rest_verbatim():
+    assert clean_url("https://example.com/a%20b?q=a%20b&foo") == "https://example.com/a%20b?q=a%20b&foo"
+    assert clean_url("https://Example.com/Path/") == "https://Example.com/Path/"
+
+
+def test_clean_url_leaves_non_http_alone():
+    assert clean_url("memo://20250101") == "memo://20250101"
+
+
+def test_canonicalize_generic_rules():
+    assert canonicalize("http://www.Example.com/post/?b=2&a=1&utm_medium=x#top") == "https://example.com/post?a=1&b=2"
+    assert canonicalize("https://m.example.com/news/1/amp") == "https://example.com/news/1"
+    assert canonicalize("https://example.com") == "https://example.com/"
+
+
+def test_canonicalize_x_status():
+    expected = "https://x.com/i/status/123"
+    assert canonicalize("https://twitter.com/someone/status/123?s=20&t=abc") == expected
+    assert canonicalize("https://mobile.x.com/someone/status/123") == expected
+    assert canonicalize("https://fxtwitter.com/someone/status/123/photo/1") == expected
+
+
+def test_canonicalize_youtube():
+    expected = "https://youtube.com/watch?v=dQw4w9WgXcQ"
+    assert canonicalize("https://youtu.be/dQw4w9WgXcQ?si=abc") == expected
+    assert canonicalize("https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share") == expected
+    assert canonicalize("https://www.youtube.com/shorts/dQw4w9WgXcQ") == expected
+
+
+def test_canonicalize_instagram_and_naver_blog():
+    assert canonicalize("https://www.instagram.com/p/Cxyz/?img_index=2&igsh=1") == "https://instagram.com/p/Cxyz"
+    assert (
+        canonicalize("https://m.blog.naver.com/PostView.naver?blogId=foo&logNo=2233")
+        == canonicalize("https://blog.naver.com/foo/2233")
+        == "https://blog.naver.com/foo/2233"
+    )
+
+
+def test_canonicalize_leaves_non_http_alone():
+    assert canonicalize("memo://image/20250101") == "memo://image/20250101"